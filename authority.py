@@ -0,0 +1,139 @@
+import asyncio
+import random
+import time
+
+from boardsync import BoardSender
+from runner import Game, TICK_MS, ACTIONS
+
+# Share of each tick the simulation may use before it counts as an overrun,
+# leaving the rest for reading inputs and writing updates
+TICK_BUDGET = 0.5
+
+# A player can't queue more than this many inputs for one tick
+MAX_INPUTS_PER_TICK = 8
+
+# If the loop falls further behind than this, missed ticks are skipped
+# instead of run back to back
+MAX_CATCH_UP = 5
+
+
+class AuthoritativeMatch:
+    # One match simulated on the server: every player's Game is advanced from
+    # their queued inputs, so boards and scores never come from a client.
+    # All players share a seed and therefore the same piece sequence.
+    def __init__(self, players, seed=None):
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        self.players = {id(client): client for client in players}
+        self.games = {key: Game(seed) for key in self.players}
+        self.inputs = {key: [] for key in self.players}
+        self.senders = {key: BoardSender() for key in self.players}
+        self.rejected = 0
+
+    @property
+    def running(self):
+        return any(self.games[key].running for key in self.players)
+
+    def queue_input(self, client, action):
+        pending = self.inputs.get(id(client))
+        if pending is None or action not in ACTIONS or len(pending) >= MAX_INPUTS_PER_TICK:
+            self.rejected += 1
+            return False
+        pending.append(action)
+        return True
+
+    def leave(self, client):
+        self.players.pop(id(client), None)
+
+    def step(self):
+        # Advances every game one tick; returns (client, state, board update,
+        # score) for each player whose game changed, for the server to send
+        updates = []
+        for key, client in self.players.items():
+            game = self.games[key]
+            pending = self.inputs[key]
+            changed = bool(pending)
+            for action in pending:
+                game.apply(action)
+            pending.clear()
+            scored = False
+            events = game.step()
+            for event in events:
+                changed = True
+                if event[0] == 'lock' and event[1]:
+                    scored = True
+            if not changed:
+                continue
+            updates.append((client, self.state(game), self.senders[key].update(game.board),
+                            game.score if scored else None))
+        return updates
+
+    def state(self, game):
+        return {
+            'type': 'state',
+            'tick': game.tick,
+            'board': game.board_with_piece(),
+            'next': game.next_piece,
+            'hold': game.hold_piece,
+            'score': game.score,
+            'over': not game.running
+        }
+
+
+class TickScheduler:
+    # Runs every authoritative match from one loop at a fixed rate. Matches
+    # are stepped back to back on each tick rather than each sleeping on its
+    # own timer, so a core can carry hundreds of them.
+    def __init__(self, interval=TICK_MS / 1000, budget=TICK_BUDGET):
+        self.interval = interval
+        self.budget = interval * budget
+        self.matches = set()
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.busy = 0.0
+        self.worst = 0.0
+
+    def add(self, match):
+        self.matches.add(match)
+
+    def remove(self, match):
+        self.matches.discard(match)
+
+    def run_tick(self, step):
+        start = time.perf_counter()
+        for match in list(self.matches):
+            step(match)
+        elapsed = time.perf_counter() - start
+        self.ticks += 1
+        self.busy += elapsed
+        self.worst = max(self.worst, elapsed)
+        if elapsed > self.budget:
+            self.overruns += 1
+
+    async def run(self, step):
+        # Deadlines are absolute, so time spent simulating doesn't stretch the tick
+        deadline = time.perf_counter()
+        while True:
+            deadline += self.interval
+            delay = deadline - time.perf_counter()
+            if -delay > self.interval * MAX_CATCH_UP:
+                missed = int(-delay / self.interval)
+                self.skipped += missed
+                deadline += missed * self.interval
+            # Yields even when behind, so connections are still read and
+            # drained between ticks of an overloaded server
+            await asyncio.sleep(max(delay, 0))
+            self.run_tick(step)
+
+    def stats(self):
+        return {
+            'matches': len(self.matches),
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'skipped': self.skipped,
+            'avg_ms': round(self.busy / self.ticks * 1000, 3) if self.ticks else 0,
+            'worst_ms': round(self.worst * 1000, 3),
+            'budget_ms': round(self.budget * 1000, 3)
+        }
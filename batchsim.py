@@ -0,0 +1,136 @@
+import numpy as np
+
+from engine import COLUMNS, ROWS, SHAPES, PIECE_STATES, LINE_SCORE, spawn_x
+
+# Actions understood by BatchSimulator.step, one per board
+NONE, LEFT, RIGHT, ROTATE, ROTATE_BACK, DOWN, HARD_DROP = range(7)
+
+# Every tetromino has four cells, so the engine tables pack into dense arrays
+CELLS = np.array([[state['cells'] for state in states] for states in PIECE_STATES], dtype=np.int64)
+SPAWN_X = np.array([spawn_x(kind) for kind in range(len(SHAPES))], dtype=np.int64)
+MAX_KICKS = max(len(state['kicks'][1]) for states in PIECE_STATES for state in states)
+
+
+def build_kicks():
+    # Shorter kick lists are padded with (0, 0), which was already probed first
+    kicks = np.zeros((len(SHAPES), 4, 2, MAX_KICKS, 2), dtype=np.int64)
+    for kind, states in enumerate(PIECE_STATES):
+        for rot, state in enumerate(states):
+            for d, direction in enumerate((1, -1)):
+                table = state['kicks'][direction]
+                kicks[kind, rot, d, :len(table)] = table
+    return kicks
+
+
+KICKS = build_kicks()
+
+
+class BatchSimulator:
+    def __init__(self, count, seed=None):
+        self.count = count
+        self.rng = np.random.default_rng(seed)
+        self.boards = np.zeros((count, ROWS, COLUMNS), dtype=bool)
+        self.score = np.zeros(count, dtype=np.int64)
+        self.lines = np.zeros(count, dtype=np.int64)
+        self.alive = np.ones(count, dtype=bool)
+        self.kind = np.zeros(count, dtype=np.int64)
+        self.rot = np.zeros(count, dtype=np.int64)
+        self.x = np.zeros(count, dtype=np.int64)
+        self.y = np.zeros(count, dtype=np.int64)
+        self.next_kind = self.rng.integers(len(SHAPES), size=count)
+        self.spawn(np.arange(count))
+
+    def spawn(self, idx):
+        self.kind[idx] = self.next_kind[idx]
+        self.next_kind[idx] = self.rng.integers(len(SHAPES), size=len(idx))
+        self.rot[idx] = 0
+        self.x[idx] = SPAWN_X[self.kind[idx]]
+        self.y[idx] = 0
+        dead = ~self.fits(idx, self.rot[idx], self.x[idx], self.y[idx])
+        self.alive[idx[dead]] = False
+
+    def fits(self, idx, rot, x, y):
+        cells = CELLS[self.kind[idx], rot]
+        cx = x[:, None] + cells[:, :, 0]
+        cy = y[:, None] + cells[:, :, 1]
+        inside = (cx >= 0) & (cx < COLUMNS) & (cy < ROWS)
+        # Cells above the top row never collide, same as Engine.fits
+        filled = self.boards[idx[:, None], np.clip(cy, 0, ROWS - 1), np.clip(cx, 0, COLUMNS - 1)]
+        return (inside & ~(filled & (cy >= 0))).all(axis=1)
+
+    def shift(self, idx, dx, dy):
+        ok = self.fits(idx, self.rot[idx], self.x[idx] + dx, self.y[idx] + dy)
+        moved = idx[ok]
+        self.x[moved] += dx
+        self.y[moved] += dy
+        return ok
+
+    def rotate(self, idx, direction):
+        d = 0 if direction == 1 else 1
+        rot = (self.rot[idx] + direction) % 4
+        kicks = KICKS[self.kind[idx], self.rot[idx], d]
+        pending = np.ones(len(idx), dtype=bool)
+        for k in range(MAX_KICKS):
+            sub = np.flatnonzero(pending)
+            if not len(sub):
+                break
+            nx = self.x[idx[sub]] + kicks[sub, k, 0]
+            ny = self.y[idx[sub]] + kicks[sub, k, 1]
+            ok = self.fits(idx[sub], rot[sub], nx, ny)
+            done = idx[sub[ok]]
+            self.rot[done] = rot[sub[ok]]
+            self.x[done] = nx[ok]
+            self.y[done] = ny[ok]
+            pending[sub[ok]] = False
+
+    def hard_drop(self, idx):
+        falling = idx
+        while len(falling):
+            falling = falling[self.shift(falling, 0, 1)]
+
+    def lock(self, idx):
+        cells = CELLS[self.kind[idx], self.rot[idx]]
+        cx = self.x[idx, None] + cells[:, :, 0]
+        cy = self.y[idx, None] + cells[:, :, 1]
+        rows = np.broadcast_to(idx[:, None], cy.shape)
+        visible = cy >= 0
+        self.boards[rows[visible], cy[visible], cx[visible]] = True
+        self.clear_lines(idx)
+        self.spawn(idx)
+
+    def clear_lines(self, idx):
+        full = self.boards[idx].all(axis=2)
+        cleared = full.sum(axis=1)
+        hit = cleared > 0
+        if not hit.any():
+            return
+        idx = idx[hit]
+        full = full[hit]
+        cleared = cleared[hit]
+        # Stable sort moves full rows to the top while keeping the others in order
+        order = np.argsort(~full, axis=1, kind='stable')
+        boards = np.take_along_axis(self.boards[idx], order[:, :, None], axis=1)
+        boards[np.arange(ROWS)[None, :] < cleared[:, None]] = False
+        self.boards[idx] = boards
+        self.score[idx] += cleared * LINE_SCORE
+        self.lines[idx] += cleared
+
+    def step(self, actions=None):
+        idx = np.flatnonzero(self.alive)
+        if actions is not None:
+            actions = np.asarray(actions)[idx]
+            for action, dx in ((LEFT, -1), (RIGHT, 1)):
+                self.shift(idx[actions == action], dx, 0)
+            self.rotate(idx[actions == ROTATE], 1)
+            self.rotate(idx[actions == ROTATE_BACK], -1)
+            self.shift(idx[actions == DOWN], 0, 1)
+            self.hard_drop(idx[actions == HARD_DROP])
+        # Gravity, then lock every board whose piece could not fall
+        landed = idx[~self.shift(idx, 0, 1)]
+        if len(landed):
+            self.lock(landed)
+        return landed
+
+    def board_rows(self, i):
+        weights = 1 << np.arange(COLUMNS)
+        return [int(row) for row in (self.boards[i] * weights).sum(axis=1)]
@@ -0,0 +1,443 @@
+import asyncio
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from engine import Engine, COLUMNS, ROWS, SHAPES, rotate_shape
+
+
+# The list-of-lists board logic TetrisClient used before engine.py, kept as a baseline
+class ListBoard:
+    def __init__(self):
+        self.board = [[0] * COLUMNS for _ in range(ROWS)]
+        self.score = 0
+
+    def collision(self, piece):
+        shape = piece['shape']
+        for y, row in enumerate(shape):
+            for x, val in enumerate(row):
+                if val:
+                    px = piece['x'] + x
+                    py = piece['y'] + y
+                    if px < 0 or px >= COLUMNS or py >= ROWS or (py >= 0 and self.board[py][px]):
+                        return True
+        return False
+
+    def move(self, piece, dx, dy):
+        piece['x'] += dx
+        piece['y'] += dy
+        if self.collision(piece):
+            piece['x'] -= dx
+            piece['y'] -= dy
+            return False
+        return True
+
+    def freeze(self, piece):
+        for y, row in enumerate(piece['shape']):
+            for x, val in enumerate(row):
+                if val:
+                    py = piece['y'] + y
+                    if 0 <= py < ROWS:
+                        self.board[py][piece['x'] + x] = 1
+        new_board = [row for row in self.board if any(val == 0 for val in row)]
+        lines_cleared = ROWS - len(new_board)
+        self.score += lines_cleared * 100
+        for _ in range(lines_cleared):
+            new_board.insert(0, [0] * COLUMNS)
+        self.board = new_board
+
+
+def placements(count, seed=0):
+    rng = random.Random(seed)
+    return [(rng.randrange(len(SHAPES)), rng.randrange(4), rng.randrange(-3, 3)) for _ in range(count)]
+
+
+def bench_list_board(moves):
+    game = ListBoard()
+    for kind, rot, dx in moves:
+        shape = SHAPES[kind]
+        for _ in range(rot):
+            shape = rotate_shape(shape)
+        piece = {'shape': shape, 'x': COLUMNS // 2 - len(shape[0]) // 2, 'y': 0}
+        if game.collision(piece):
+            game = ListBoard()
+            continue
+        step = 1 if dx > 0 else -1
+        for _ in range(abs(dx)):
+            game.move(piece, step, 0)
+        while game.move(piece, 0, 1):
+            pass
+        game.freeze(piece)
+
+
+def bench_engine(moves, surface_drop=True):
+    # With surface_drop the piece lands through Engine.drop (hard drop);
+    # otherwise it falls a row per move like gravity and the list board
+    rng = random.Random(0)
+    engine = Engine(rng)
+    for kind, rot, dx in moves:
+        piece = engine.new_piece(kind)
+        piece['rot'] = rot
+        if engine.collision(piece):
+            engine = Engine(rng)
+            continue
+        step = 1 if dx > 0 else -1
+        for _ in range(abs(dx)):
+            engine.move(piece, step, 0)
+        if surface_drop:
+            engine.drop(piece)
+        else:
+            while engine.move(piece, 0, 1):
+                pass
+        engine.lock(piece)
+
+
+def timed(fn, *args, repeat=3):
+    # Best of a few runs, so one scheduler hiccup doesn't decide the ratio
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_placements(count=20000):
+    # Both bitboard runs end every piece in the same spot as the list board;
+    # they differ in how it gets there. Row by row is the gravity path Game
+    # and TetrisClient use; the list board has no other way to drop a piece.
+    moves = placements(count)
+    old = timed(bench_list_board, moves)
+    rows = timed(bench_engine, moves, False)
+    drop = timed(bench_engine, moves, True)
+    print(f"list board, row by row: {count / old:12.0f} placements/s")
+    print(f"bitboard, row by row:   {count / rows:12.0f} placements/s  ({old / rows:.1f}x)")
+    print(f"bitboard, surface drop: {count / drop:12.0f} placements/s  ({old / drop:.1f}x)")
+
+
+def run_batch(count=10000, steps=200):
+    from batchsim import BatchSimulator, HARD_DROP
+
+    sim = BatchSimulator(count, seed=0)
+    # Dead boards are skipped by step(), so only live boards are counted
+    live = 0
+    start = time.perf_counter()
+    for _ in range(steps):
+        live += int(sim.alive.sum())
+        sim.step(sim.rng.integers(HARD_DROP + 1, size=count))
+    elapsed = time.perf_counter() - start
+    print(f"{count} boards x {steps} steps: {live / elapsed:12.0f} live board-steps/s"
+          f"  ({int(sim.alive.sum())} still alive)")
+
+
+def run_headless_games(count=200):
+    from runner import run_headless, ACTIONS
+
+    rng = random.Random(0)
+    scripts = [[(t, rng.choice(ACTIONS)) for t in range(0, 5000, 3)] for _ in range(count)]
+    start = time.perf_counter()
+    ticks = sum(run_headless(seed, script).tick for seed, script in enumerate(scripts))
+    elapsed = time.perf_counter() - start
+    print(f"{count} headless games: {ticks / elapsed:12.0f} ticks/s")
+
+
+def run_board_sync(games=50):
+    from boardsync import BoardSender, PieceSender
+    from engine import board_to_matrix
+    from lockstep import InputSender
+    from protocol import encode
+    from runner import Game, ACTIONS, GRAVITY_TICKS
+
+    rng = random.Random(0)
+    full_bytes = delta_bytes = piece_bytes = input_bytes = 0
+    for seed in range(games):
+        game = Game(seed)
+        sender = BoardSender()
+        pieces = PieceSender()
+        inputs = InputSender(game)
+        while game.running and game.tick < 20000:
+            if rng.random() < 0.3:
+                game.apply(rng.choice(ACTIONS))
+            update = inputs.update()
+            if update:
+                input_bytes += len(encode(update, True))
+            game.step()
+            if game.tick % GRAVITY_TICKS == 0:
+                full_bytes += len(encode({'type': 'board', 'board': board_to_matrix(game.board)}))
+            update = sender.update(game.board)
+            if update:
+                delta_bytes += len(encode(update))
+            update = pieces.update(game)
+            if update:
+                piece_bytes += len(encode(update, True))
+    print(f"full board every gravity tick: {full_bytes:10d} bytes")
+    print(f"deltas checked every tick:     {delta_bytes:10d} bytes  ({1 - delta_bytes / full_bytes:.1%} less)")
+    print(f"falling piece reports (binary): {piece_bytes:9d} bytes  (extrapolated between reports)")
+    print(f"lockstep inputs (binary):      {input_bytes:10d} bytes  ({1 - input_bytes / full_bytes:.1%} less)")
+
+
+def run_codec(count=20000):
+    from engine import board_to_matrix
+    from protocol import encode, FrameDecoder
+
+    rng = random.Random(0)
+    rows = [rng.randrange(1 << COLUMNS) for _ in range(ROWS)]
+    old = {'type': 'board', 'board': board_to_matrix(rows)}
+    new = {'type': 'board', 'seq': 1, 'board': rows, 'piece': None}
+    for name, msg, binary in (('json matrix', old, False), ('binary', new, True)):
+        start = time.perf_counter()
+        frames = [encode(msg, binary) for _ in range(count)]
+        FrameDecoder().feed(b''.join(frames))
+        elapsed = time.perf_counter() - start
+        print(f"{name:12s} {len(frames[0]):4d} bytes/board  {count / elapsed:10.0f} encode+decode/s")
+
+
+def run_lobby(players=500):
+    from protocol import encode
+
+    # Every player joins, then everyone toggles ready once; bytes sent to the room
+    lobby = []
+    full_bytes = delta_bytes = 0
+    for version, i in enumerate(range(players * 2), 1):
+        if i < players:
+            player = {'id': i, 'name': f"player{i}", 'ready': False}
+            lobby.append(player)
+            event = {'type': 'player_joined', 'version': version, 'player': player}
+        else:
+            player = lobby[i - players]
+            player['ready'] = True
+            event = {'type': 'ready_changed', 'version': version, 'id': player['id'], 'ready': True}
+        snapshot = {'type': 'lobby', 'room': 'main', 'version': version, 'players': lobby}
+        full_bytes += len(encode(snapshot, True)) * len(lobby)
+        delta_bytes += len(encode(event, True)) * (len(lobby) - 1) + (len(encode(snapshot, True)) if i < players else 0)
+    print(f"full list per change:  {full_bytes:12d} bytes")
+    print(f"events plus snapshots: {delta_bytes:12d} bytes  ({full_bytes / delta_bytes:.0f}x less)")
+
+
+def run_broadcast(spectators=1000, messages=500):
+    import server
+    from outbox import Outbox
+    from protocol import encode
+
+    rng = random.Random(0)
+    room = {'players': {}}
+    for i in range(spectators):
+        client = {'binary': i % 4 != 0, 'outbox': Outbox(limit=messages * 4), 'writer': None}
+        room['players'][i] = client
+    msg = {'type': 'board', 'seq': 1, 'board': [rng.randrange(1 << COLUMNS) for _ in range(ROWS)], 'piece': None}
+    frame = encode(msg, True)
+
+    def per_recipient():
+        for client in room['players'].values():
+            client['outbox'].put(encode(msg, client['binary']), ('board', 0), True)
+
+    def clear():
+        for client in room['players'].values():
+            client['outbox'].frames.clear()
+
+    for name, send in (('encode per recipient', per_recipient),
+                       ('encode once', lambda: server.broadcast(msg, room, key=('board', 0), supersedes=True)),
+                       ('forward frame', lambda: server.broadcast(msg, room, key=('board', 0), supersedes=True, frame=frame))):
+        start = time.perf_counter()
+        for _ in range(messages):
+            send()
+        elapsed = time.perf_counter() - start
+        clear()
+        print(f"{name:21s} {messages * spectators / elapsed:12.0f} deliveries/s")
+
+
+def run_matchmaking(count=20000):
+    from matchmaking import MatchQueue
+
+    rng = random.Random(0)
+    players = [{'name': i} for i in range(count)]
+    queue = MatchQueue()
+    start = time.perf_counter()
+    matched = 0
+    for i, player in enumerate(players):
+        queue.add(player, int(rng.gauss(1000, 200)), now=i * 0.001)
+        matched += queue.find_match(player, now=i * 0.001) is not None
+    matched += len(queue.match_all(now=count * 0.001 + 5))
+    elapsed = time.perf_counter() - start
+    print(f"{count} ready toggles: {count / elapsed:10.0f} queued/s  ({matched} pairs, {len(queue)} still waiting)")
+
+
+def run_authority(matches=500, ticks=200):
+    from authority import AuthoritativeMatch, TickScheduler
+    from protocol import encode
+    from runner import TICK_MS, ACTIONS
+
+    rng = random.Random(0)
+    scheduler = TickScheduler()
+    for seed in range(matches):
+        scheduler.add(AuthoritativeMatch([{'name': 'a'}, {'name': 'b'}], seed))
+
+    def step(match):
+        for player in match.players.values():
+            if rng.random() < 0.3:
+                match.queue_input(player, rng.choice(ACTIONS))
+        for client, state, board, score in match.step():
+            encode(state)
+            if board is not None:
+                encode(board, True)
+
+    for _ in range(ticks):
+        scheduler.run_tick(step)
+    stats = scheduler.stats()
+    print(f"{matches} matches: {stats['avg_ms']:.2f} ms/tick avg, {stats['worst_ms']:.2f} ms worst"
+          f"  ({stats['avg_ms'] / TICK_MS:.0%} of a {TICK_MS} ms tick, {stats['overruns']} overruns)")
+
+
+def run_leaderboard(count=1000000, queries=1000):
+    from leaderboard import Leaderboard
+
+    rng = random.Random(0)
+    board = Leaderboard()
+    start = time.perf_counter()
+    for i in range(count):
+        board.submit(f"player{i}", rng.randrange(1000000))
+    elapsed = time.perf_counter() - start
+    print(f"{count} submits: {count / elapsed:10.0f} updates/s")
+
+    names = [f"player{rng.randrange(count)}" for _ in range(queries)]
+    start = time.perf_counter()
+    for name in names:
+        board.submit(name, board.scores[name] + 1)
+    update = (time.perf_counter() - start) / queries
+    start = time.perf_counter()
+    for name in names:
+        board.top(10)
+    top = (time.perf_counter() - start) / queries
+    worst = 0.0
+    for name in names:
+        board.submit(name, board.scores[name] + 1)
+        start = time.perf_counter()
+        board.rank(name)
+        worst = max(worst, time.perf_counter() - start)
+    print(f"update {update * 1e6:.1f} us, top 10 {top * 1e6:.1f} us, rank {worst * 1e6:.1f} us worst")
+
+
+def run_overload(seconds=1.0):
+    # A step slower than the tick: the scheduler falls behind for good, but
+    # other tasks on the loop must keep running
+    from authority import TickScheduler
+
+    async def overloaded():
+        scheduler = TickScheduler(interval=0.01)
+        scheduler.add(object())
+        ticker = asyncio.create_task(scheduler.run(lambda match: time.sleep(0.015)))
+        beats = 0
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            await asyncio.sleep(0.001)
+            beats += 1
+        ticker.cancel()
+        return scheduler.stats(), beats
+
+    stats, beats = asyncio.run(overloaded())
+    print(f"{stats['ticks']} overloaded ticks, {stats['overruns']} overruns, {stats['skipped']} skipped;"
+          f" other tasks ran {beats} times")
+    if not beats:
+        raise RuntimeError("tick scheduler starved the event loop")
+
+
+BENCH_PORT = 5602
+
+
+def start_bench_server(workers=1):
+    code = f"import server; server.PORT = {BENCH_PORT}; server.start_server({workers})"
+    proc = subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.DEVNULL)
+    for _ in range(50):
+        time.sleep(0.2)
+        try:
+            socket.create_connection(('127.0.0.1', BENCH_PORT)).close()
+            return proc
+        except OSError:
+            pass
+    proc.terminate()
+    raise RuntimeError("bench server did not start")
+
+
+async def connect_many(count):
+    conns = []
+    for _ in range(count):
+        conns.append(await asyncio.open_connection('127.0.0.1', BENCH_PORT))
+    return conns
+
+
+async def read_frames(reader, decoder, count):
+    messages = []
+    while len(messages) < count:
+        messages += decoder.feed(await reader.read(65536))
+    return messages
+
+
+async def connections_bench(count, messages):
+    from protocol import encode, FrameDecoder
+
+    start = time.perf_counter()
+    conns = await connect_many(count)
+    for i, (reader, writer) in enumerate(conns):
+        writer.write(encode({'type': 'join', 'username': f"p{i}", 'codec': 'binary', 'room': f"bench-{i // 2}"}))
+    decoders = [FrameDecoder() for _ in conns]
+    # The first player in each room gets two lobby updates, the second gets one
+    await asyncio.gather(*(read_frames(r, d, 2 - i % 2) for (r, w), d, i in zip(conns, decoders, range(count))))
+    print(f"{count} connections joined {count // 2} rooms in {time.perf_counter() - start:.2f}s")
+
+    frame = encode({'type': 'score', 'value': 1}, True)
+    start = time.perf_counter()
+    for reader, writer in conns:
+        writer.write(frame * messages)
+    await asyncio.gather(*(read_frames(r, d, messages) for (r, w), d in zip(conns, decoders)))
+    elapsed = time.perf_counter() - start
+    print(f"relayed {count * messages} messages in {count // 2} rooms: {count * messages / elapsed:10.0f} msg/s")
+    for reader, writer in conns:
+        writer.close()
+
+
+def run_connections(count=5000, messages=20, workers=1):
+    proc = start_bench_server(workers)
+    try:
+        asyncio.run(connections_bench(count, messages))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def run_sharding(count=2000, messages=20):
+    # The same room traffic with the server split over more workers; the
+    # bench client is one process, so it can become the limit first
+    import os
+
+    print(f"{os.cpu_count()} CPUs")
+    for workers in (1, 2, 4):
+        print(f"-- {workers} worker{'s' if workers > 1 else ''}")
+        run_connections(count, messages, workers)
+
+
+BENCHMARKS = {
+    'placements': run_placements,
+    'batch': run_batch,
+    'headless': run_headless_games,
+    'board_sync': run_board_sync,
+    'codec': run_codec,
+    'connections': run_connections,
+    'sharding': run_sharding,
+    'lobby': run_lobby,
+    'broadcast': run_broadcast,
+    'matchmaking': run_matchmaking,
+    'authority': run_authority,
+    'overload': run_overload,
+    'leaderboard': run_leaderboard,
+}
+
+if __name__ == "__main__":
+    # A name can take integer arguments after colons, e.g. connections:5000:20:4
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        name, *args = name.split(':')
+        print(f"== {name}")
+        BENCHMARKS[name](*map(int, args))
@@ -0,0 +1,119 @@
+from engine import Engine, ROWS
+from runner import GRAVITY_TICKS
+
+# A full board is sent every KEYFRAME_EVERY updates so late joiners and
+# anyone who fell out of step recover without asking
+KEYFRAME_EVERY = 100
+
+
+class BoardSender:
+    # Turns successive boards into keyframes and changed-row deltas. TCP
+    # delivers in order, so each delta is based on the previous message sent.
+    def __init__(self, keyframe_every=KEYFRAME_EVERY):
+        self.keyframe_every = keyframe_every
+        self.rows = None
+        self.seq = 0
+        self.since_keyframe = 0
+
+    def request_keyframe(self):
+        self.rows = None
+
+    def update(self, rows):
+        self.since_keyframe += 1
+        if self.rows is None or self.since_keyframe >= self.keyframe_every:
+            return self.keyframe(rows)
+        changed = [[y, row] for y, (row, old) in enumerate(zip(rows, self.rows)) if row != old]
+        if not changed:
+            return None
+        self.seq += 1
+        self.rows = list(rows)
+        return {'type': 'board_delta', 'seq': self.seq, 'rows': changed}
+
+    def keyframe(self, rows):
+        self.seq += 1
+        self.since_keyframe = 0
+        self.rows = list(rows)
+        return {'type': 'board', 'seq': self.seq, 'board': self.rows}
+
+
+class BoardMirror:
+    def __init__(self):
+        self.rows = [0] * ROWS
+        self.seq = None
+        self.stale = False
+
+    def apply(self, msg):
+        # Returns True the first time a delta does not follow the last applied
+        # message, which is when the caller should ask the sender for a keyframe
+        if msg['type'] == 'board':
+            self.rows = list(msg['board'])
+            self.seq = msg['seq']
+            self.stale = False
+            return False
+        if self.stale or self.seq is None or msg['seq'] != self.seq + 1:
+            first = not self.stale
+            self.stale = True
+            return first
+        for y, row in msg['rows']:
+            self.rows[y] = row
+        self.seq = msg['seq']
+        return False
+
+
+class PiecePredictor:
+    # Dead reckoning for a remote falling piece: from the last reported state
+    # it drops a row every gravity period until the board stops it, as in the
+    # real game. Sender and receiver run the same prediction, so a piece only
+    # has to be reported when it stops matching: an input, a lock, a new piece.
+    def __init__(self, gravity_ticks=GRAVITY_TICKS):
+        self.engine = Engine()
+        self.gravity_ticks = gravity_ticks
+        self.state = None
+
+    def set_board(self, rows):
+        self.engine.set_board(rows)
+
+    def reset(self, msg):
+        self.state = msg
+
+    def predict(self, tick):
+        state = self.state
+        if state is None:
+            return None
+        kind, rot, x, y = state['kind'], state['rot'], state['x'], state['y']
+        falls = tick // self.gravity_ticks - state['tick'] // self.gravity_ticks
+        while falls > 0 and self.engine.fits(kind, rot, x, y + 1):
+            y += 1
+            falls -= 1
+        return {'kind': kind, 'rot': rot, 'x': x, 'y': y}
+
+    def board_with_piece(self, tick):
+        piece = self.predict(tick)
+        if piece is None:
+            return self.engine.board
+        return self.engine.board_with_piece(piece)
+
+
+class PieceSender:
+    # Reports the local falling piece only when the peer's prediction would
+    # be wrong. min_interval spaces reports out on slow links; the peer keeps
+    # extrapolating in between.
+    def __init__(self, min_interval=1, gravity_ticks=GRAVITY_TICKS):
+        self.predictor = PiecePredictor(gravity_ticks)
+        self.min_interval = min_interval
+        self.sent_tick = None
+
+    def update(self, game):
+        tick = game.tick
+        if self.sent_tick is not None and tick - self.sent_tick < self.min_interval:
+            return None
+        if game.board != self.predictor.engine.board:
+            self.predictor.set_board(game.board)
+        piece = game.current_piece
+        if self.predictor.predict(tick) == piece:
+            return None
+        msg = {'type': 'piece_state', 'tick': tick, 'kind': piece['kind'], 'rot': piece['rot'],
+               'x': piece['x'], 'y': piece['y']}
+        self.predictor.reset(msg)
+        self.sent_tick = tick
+        return msg
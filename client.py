@@ -1,11 +1,17 @@
 import tkinter as tk
 import socket
 import threading
-import json
 import random
-import time
 import queue
+import time
+from collections import deque
 import pygame
+from engine import COLUMNS, ROWS
+from renderer import BoardRenderer, PieceRenderer
+from protocol import encode, FrameDecoder
+from boardsync import BoardSender, BoardMirror, PieceSender, PiecePredictor
+from runner import Game, TICK_MS
+from lockstep import InputSender, OpponentSim
 
 # Networking
 HOST = '127.0.0.1'
@@ -13,21 +19,37 @@ PORT = 5555
 
 # Tetris Constants
 TILE_SIZE = 30
-COLUMNS = 10
-ROWS = 20
-
-SHAPES = [
-    [[1, 1, 1], [0, 1, 0]],  # T
-    [[1, 1, 1, 1]],          # I
-    [[1, 1], [1, 1]],        # O
-    [[0, 1, 1], [1, 1, 0]],  # S
-    [[1, 1, 0], [0, 1, 1]],  # Z
-    [[1, 0, 0], [1, 1, 1]],  # L
-    [[0, 0, 1], [1, 1, 1]]   # J
-]
+
+# Rendering and key repeat
+FPS = 60
+DAS_MS = 170  # delay before a held key starts repeating
+ARR_MS = 50   # repeat interval once it does
+RELEASE_GRACE_MS = 30  # X11 autorepeat sends release/press pairs this close together
+HELD_ACTIONS = {'Left': 'left', 'Right': 'right', 'Down': 'down'}
+
+# Wire codec: 'binary' for play, 'json' to read the traffic while debugging
+CODEC = 'binary'
+
+LOBBY_EVENTS = ('lobby', 'player_joined', 'player_left', 'ready_changed')
+
+# Outgoing types whose newest message makes older queued ones pointless:
+# type -> (coalescing key, supersedes). A board keyframe replaces any board
+# or delta still queued; deltas build on each other, so they never replace.
+SUPERSEDING = {
+    'board': ('board', True),
+    'board_delta': ('board', False),
+    'score': ('score', True),
+    'piece_state': ('piece_state', True),
+    'next_piece': ('next_piece', True),
+    'hold_piece': ('hold_piece', True),
+}
+SEND_WARN_DEPTH = 32  # report when this many messages were waiting for one write
+
+# Incoming types where only the newest in a batch matters
+LATEST_ONLY = ('score', 'state', 'piece_state')
 
 class TetrisClient:
-    def __init__(self):
+    def __init__(self, fps=FPS, codec=CODEC):
         self.root = tk.Tk()
         self.root.title("Tetris Login")
         self.root.geometry("400x500")
@@ -35,41 +57,89 @@ class TetrisClient:
         self.root.resizable(False, False)
 
         self.root.bind("<Key>", self.key_press)
-        self.hold_piece = None
-        self.can_hold = True
+        self.root.bind("<KeyRelease>", self.key_release)
+
+        self.frame_ms = max(1, 1000 // fps)
+        self.running = False
+        self.dirty = False
+        self.held = {}
 
         self.username = None
+        self.joined = False  # until the server sends our first lobby snapshot
         self.conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.conn.connect((HOST, PORT))
 
         self.send_queue = queue.Queue()
+        self.send_stats = {'high_water': 0, 'messages': 0, 'coalesced': 0, 'writes': 0}
+        self.codec = codec
         self.is_solo = False
-        self.last_board_send_time = 0
+        self.authoritative = False
+        self.lockstep = False
+        self.seed = None
 
         self.FONT_NAME = "Trebuchet MS"
         self.FONT_TITLE = (self.FONT_NAME, 18, "bold")
         self.FONT_LABEL = (self.FONT_NAME, 12)
         self.FONT_BUTTON = (self.FONT_NAME, 10, "bold")
 
+        # Filled by the listener thread, drained on the Tk thread; deque
+        # append and popleft are atomic, so no lock is needed
+        self.inbox = deque()
+        self.opponent_rows = None
+
         self.show_login()
 
         threading.Thread(target=self.listen_server, daemon=True).start()
         threading.Thread(target=self.sender_thread, daemon=True).start()
 
+        self.pump_inbox()
         self.root.mainloop()
 
     def sender_thread(self):
+        # Takes everything queued since the last write, drops what newer
+        # messages supersede and sends the rest in one sendall, so after a
+        # stall the opponent gets the current board, not a replay
+        stats = self.send_stats
         while True:
-            msg = self.send_queue.get()
+            pending = [self.send_queue.get()]
+            while True:
+                try:
+                    pending.append(self.send_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if len(pending) > stats['high_water']:
+                stats['high_water'] = len(pending)
+                if len(pending) >= SEND_WARN_DEPTH:
+                    print(f"Send queue reached {len(pending)} messages")
+            frames = self.coalesce(pending)
+            stats['messages'] += len(pending)
+            stats['coalesced'] += len(pending) - len(frames)
+            stats['writes'] += 1
             try:
-                self.conn.sendall(msg.encode())
+                self.conn.sendall(b''.join(frames))
             except Exception as e:
                 print("Error sending:", e)
 
+    @staticmethod
+    def coalesce(pending):
+        # Newest first: once a superseding message is kept, anything older
+        # with its key is dropped
+        frames = []
+        superseded = set()
+        for frame, key, supersedes in reversed(pending):
+            if key in superseded:
+                continue
+            if supersedes:
+                superseded.add(key)
+            frames.append(frame)
+        frames.reverse()
+        return frames
+
     def safe_send(self, msg_dict):
-        self.send_queue.put(json.dumps(msg_dict))
+        key, supersedes = SUPERSEDING.get(msg_dict['type'], (None, False))
+        self.send_queue.put((encode(msg_dict, self.codec == 'binary'), key, supersedes))
 
-    def show_login(self):
+    def show_login(self, error=None):
         self.clear_window()
 
         self.bg_canvas = tk.Canvas(self.root, width=400, height=500, bg="#222244", highlightthickness=0)
@@ -92,6 +162,14 @@ class TetrisClient:
         tk.Label(login_frame, text="Username:", font=self.FONT_LABEL, bg="#333366", fg="white").pack(anchor="w")
         self.name_entry = tk.Entry(login_frame, font=self.FONT_LABEL)
         self.name_entry.pack(fill="x", pady=5)
+        tk.Label(login_frame, text="Room (optional):", font=self.FONT_LABEL, bg="#333366", fg="white").pack(anchor="w")
+        self.room_entry = tk.Entry(login_frame, font=self.FONT_LABEL)
+        self.room_entry.pack(fill="x", pady=5)
+        tk.Label(login_frame, text="Room password:", font=self.FONT_LABEL, bg="#333366", fg="white").pack(anchor="w")
+        self.room_pass_entry = tk.Entry(login_frame, font=self.FONT_LABEL, show="*")
+        self.room_pass_entry.pack(fill="x", pady=5)
+        if error:
+            tk.Label(login_frame, text=error, font=self.FONT_LABEL, bg="#333366", fg="#ff6666").pack(pady=5)
 
         tk.Button(login_frame, text="Login", font=self.FONT_BUTTON, bg="#44aa88", fg="white", command=self.join_lobby).pack(pady=10)
 
@@ -110,7 +188,8 @@ class TetrisClient:
         username = self.name_entry.get()
         if username:
             self.username = username
-            self.conn.send(self.username.encode())
+            self.safe_send({"type": "join", "username": self.username, "codec": self.codec,
+                            "room": self.room_entry.get(), "password": self.room_pass_entry.get()})
             self.lobby_screen()
 
     def lobby_screen(self):
@@ -120,6 +199,9 @@ class TetrisClient:
         self.status_label.pack(pady=10)
         self.players_frame = tk.Frame(self.root, bg="#444477")
         self.players_frame.pack(pady=5, padx=10, fill="both", expand=True)
+        self.lobby_rows = {}  # player id -> {'label', 'name', 'ready'}
+        self.lobby_version = None
+        self.lobby_resyncing = False
 
         self.ready = False
         self.ready_button = tk.Button(self.root, text="Ready", font=self.FONT_BUTTON, bg="#44aa88", fg="white", command=self.toggle_ready)
@@ -132,9 +214,13 @@ class TetrisClient:
         self.ready = not self.ready
         self.safe_send({"type": "ready", "ready": self.ready})
         self.ready_button.config(text="Unready" if self.ready else "Ready")
+        self.status_label.config(text="Searching for an opponent..." if self.ready else "Waiting for players...")
 
     def force_start(self):
         self.is_solo = True
+        self.authoritative = False
+        self.lockstep = False
+        self.seed = None
         self.countdown_and_start()
 
     def countdown_and_start(self):
@@ -148,46 +234,152 @@ class TetrisClient:
         do_countdown(3)
 
     def listen_server(self):
+        decoder = FrameDecoder()
         while True:
             try:
                 data = self.conn.recv(4096)
                 if not data:
                     break
-                msg = json.loads(data.decode())
-
-                if msg['type'] == 'lobby' and hasattr(self, 'players_frame') and self.players_frame.winfo_exists():
-                    self.update_lobby(msg['players'])
-
-                elif msg['type'] == 'start':
-                    self.is_solo = False
-                    self.start_game()
-
-                elif msg['type'] == 'score' and not self.is_solo:
-                    if hasattr(self, 'opponent_score_label') and self.opponent_score_label.winfo_exists():
-                        self.opponent_score_label.config(text=f"Opponent Score: {msg['value']}")
-
-                elif msg['type'] == 'board' and not self.is_solo:
-                    if hasattr(self, 'opponent_canvas') and self.opponent_canvas.winfo_exists():
-                        self.draw_opponent_board(msg['board'])
-
-                elif msg['type'] == 'countdown':  # Added
-                    self.show_countdown(msg['value'])
+                # Never touches Tk; pump_inbox handles these on the main thread
+                self.inbox.extend(decoder.feed(data))
 
             except Exception as e:
                 print("Error in client listener:", e)
                 break
 
+    def pump_inbox(self):
+        # Once per frame: handle everything received since the last one, then
+        # redraw the opponent at most once however many updates came in
+        inbox = self.inbox
+        if inbox:
+            messages = [inbox.popleft() for _ in range(len(inbox))]
+            for msg in self.latest_only(messages):
+                self.handle_message(msg)
+        if hasattr(self, 'opponent_piece') and self.opponent_piece.state is not None:
+            # Extrapolate the opponent's falling piece between their reports
+            self.opponent_rows = self.opponent_piece.board_with_piece(self.opponent_tick())
+        if self.opponent_rows is not None:
+            if hasattr(self, 'opponent_canvas') and self.opponent_canvas.winfo_exists():
+                self.draw_opponent_board(self.opponent_rows)
+            self.opponent_rows = None
+        self.root.after(self.frame_ms, self.pump_inbox)
+
+    @staticmethod
+    def latest_only(messages):
+        # Drops scores and states that a newer one in the batch replaces, and
+        # opponent boards and deltas from before the last keyframe
+        last = {}
+        for i, msg in enumerate(messages):
+            if msg['type'] in LATEST_ONLY or msg['type'] == 'board':
+                last[msg['type']] = i
+        keyframe = last.get('board', -1)
+        return [msg for i, msg in enumerate(messages)
+                if not (msg['type'] in LATEST_ONLY and i != last[msg['type']])
+                and not (msg['type'] in ('board', 'board_delta') and i < keyframe)]
+
+    def handle_message(self, msg):
+        if msg['type'] in LOBBY_EVENTS and hasattr(self, 'players_frame') and self.players_frame.winfo_exists():
+            self.update_lobby(msg)
+
+        elif msg['type'] == 'start':
+            self.is_solo = False
+            self.authoritative = msg.get('authoritative', False)
+            self.lockstep = msg.get('lockstep', False)
+            self.seed = msg.get('seed')
+            self.start_game()
+
+        elif msg['type'] == 'state' and self.authoritative and self.running:
+            self.on_state(msg)
+
+        elif msg['type'] == 'score' and not self.is_solo:
+            if hasattr(self, 'opponent_score_label') and self.opponent_score_label.winfo_exists():
+                self.opponent_score_label.config(text=f"Opponent Score: {msg['value']}")
+
+        elif msg['type'] in ('board', 'board_delta') and not self.is_solo:
+            if hasattr(self, 'opponent_canvas') and self.opponent_canvas.winfo_exists():
+                if self.opponent_board.apply(msg):
+                    self.safe_send({"type": "resync"})
+                self.opponent_rows = self.opponent_board.rows
+                self.opponent_piece.set_board(self.opponent_board.rows)
+
+        elif msg['type'] == 'piece_state' and not self.is_solo and hasattr(self, 'opponent_piece'):
+            # The report is the truth; prediction restarts from it
+            self.opponent_piece.reset(msg)
+            self.opponent_piece_seen = time.monotonic()
+
+        elif msg['type'] == 'inputs' and self.lockstep and hasattr(self, 'opponent_sim'):
+            if self.opponent_sim.apply(msg):
+                # Our copy of the opponent drifted; ask them to stream boards instead
+                self.safe_send({"type": "resync"})
+            elif not self.opponent_sim.desynced:
+                self.opponent_rows = self.opponent_sim.game.board_with_piece()
+
+        elif msg['type'] == 'resync' and hasattr(self, 'board_sender'):
+            self.board_sender.request_keyframe()
+            self.stream_boards = True
+
+        elif msg['type'] == 'countdown':  # Added
+            self.show_countdown(msg['value'])
+
+        elif msg['type'] == 'error':
+            print("Server error:", msg['message'])
+            if not self.joined:
+                # The join was refused; the server still expects one, so back to login
+                self.show_login(msg['message'])
+            elif hasattr(self, 'status_label') and self.status_label.winfo_exists():
+                self.status_label.config(text=msg['message'])
+
     def show_countdown(self, value):
         countdown_label = tk.Label(self.root, text=str(value), font=("Trebuchet MS", 48), fg="white", bg="#222244")
         countdown_label.place(relx=0.5, rely=0.5, anchor="center")
         self.root.after(1000, countdown_label.destroy)
 
-    def update_lobby(self, players):
-        for widget in self.players_frame.winfo_children():
-            widget.destroy()
-        for player in players:
-            text = f"{player['name']} - {'Ready' if player['ready'] else 'Not Ready'}"
-            tk.Label(self.players_frame, text=text, font=self.FONT_LABEL, bg="#444477", fg="white").pack(pady=2, anchor="w")
+    def update_lobby(self, msg):
+        # A snapshot replaces the list; events apply in version order, and a
+        # gap means one went missing, so ask for a snapshot instead of guessing
+        if msg['type'] == 'lobby':
+            if msg.get('room'):
+                self.status_label.config(text=f"Room {msg['room']}: waiting for players...")
+            present = {player['id'] for player in msg['players']}
+            for player_id in [player_id for player_id in self.lobby_rows if player_id not in present]:
+                self.remove_lobby_player(player_id)
+            for player in msg['players']:
+                self.set_lobby_player(player['id'], player['name'], player['ready'])
+            self.lobby_version = msg['version']
+            self.lobby_resyncing = False
+            self.joined = True
+            return
+        if self.lobby_version is None or msg['version'] != self.lobby_version + 1:
+            if not self.lobby_resyncing:
+                self.lobby_resyncing = True
+                self.safe_send({"type": "lobby_resync"})
+            return
+        self.lobby_version = msg['version']
+        if msg['type'] == 'player_joined':
+            player = msg['player']
+            self.set_lobby_player(player['id'], player['name'], player['ready'])
+        elif msg['type'] == 'player_left':
+            self.remove_lobby_player(msg['id'])
+        elif msg['id'] in self.lobby_rows:
+            self.set_lobby_player(msg['id'], self.lobby_rows[msg['id']]['name'], msg['ready'])
+
+    def set_lobby_player(self, player_id, name, ready):
+        # Only touches the one label, and only if its text changed
+        text = f"{name} - {'Ready' if ready else 'Not Ready'}"
+        row = self.lobby_rows.get(player_id)
+        if row is None:
+            label = tk.Label(self.players_frame, text=text, font=self.FONT_LABEL, bg="#444477", fg="white")
+            label.pack(pady=2, anchor="w")
+            self.lobby_rows[player_id] = {'label': label, 'name': name, 'ready': ready}
+        elif (row['name'], row['ready']) != (name, ready):
+            row['label'].config(text=text)
+            row['name'] = name
+            row['ready'] = ready
+
+    def remove_lobby_player(self, player_id):
+        row = self.lobby_rows.pop(player_id, None)
+        if row is not None:
+            row['label'].destroy()
 
     def start_game(self):
         pygame.mixer.init()
@@ -230,197 +422,171 @@ class TetrisClient:
         self.hold_piece_canvas = tk.Canvas(side_panel, width=6 * TILE_SIZE, height=6 * TILE_SIZE, bg='darkgrey')
         self.hold_piece_canvas.pack(pady=10)
 
-        self.board = [[0] * COLUMNS for _ in range(ROWS)]
-        self.current_piece = self.new_piece()
-        self.next_piece = self.new_piece()
-        self.score = 0
+        self.board_view = BoardRenderer(self.canvas, COLUMNS, ROWS, TILE_SIZE, "green")
+        if not self.is_solo:
+            self.opponent_view = BoardRenderer(self.opponent_canvas, COLUMNS, ROWS, TILE_SIZE, "red")
+        self.next_view = PieceRenderer(self.next_piece_canvas, 6 * TILE_SIZE, TILE_SIZE // 2, "purple")
+        self.hold_view = PieceRenderer(self.hold_piece_canvas, 6 * TILE_SIZE, TILE_SIZE // 2, "cyan")
+        self.frame_touched = 0
+
+        self.game = Game(self.seed)
+        self.server_state = None
+        self.board_sender = BoardSender()
+        self.opponent_board = BoardMirror()
+        self.piece_sender = PieceSender()
+        self.opponent_piece = PiecePredictor()
+        self.opponent_piece_seen = None
+        # In lockstep both sides simulate each other from inputs; boards are
+        # only streamed once the opponent reports a desync
+        self.stream_boards = not self.lockstep
+        if self.lockstep:
+            self.input_sender = InputSender(self.game)
+            self.opponent_sim = OpponentSim(self.seed)
         self.running = True
-        self.can_hold = True  # ➕ Reset on game start
+        self.dirty = True
+        self.held = {}
 
         self.root.bind("<Key>", self.key_press)
-        self.game_loop()
-
-    def new_piece(self):
-        shape = random.choice(SHAPES)
-        return {'shape': shape, 'x': COLUMNS // 2 - len(shape[0]) // 2, 'y': 0}
+        self.root.bind("<KeyRelease>", self.key_release)
+        if not self.authoritative:
+            # In authoritative matches the server runs this game and sends state
+            self.game_loop()
+        self.frame_clock()
+
+    @property
+    def score(self):
+        if self.authoritative:
+            return self.server_state['score'] if self.server_state else 0
+        return self.game.score
+
+    def act(self, action):
+        if self.authoritative:
+            self.safe_send({"type": "input", "action": action})
+        else:
+            self.game.apply(action)
+
+    def on_state(self, state):
+        scored = self.server_state is None or state['score'] != self.server_state['score']
+        self.server_state = state
+        self.dirty = True
+        if scored:
+            self.score_label.config(text=f"Your Score: {self.score}")
+        if state['over']:
+            self.running = False
+            self.score_label.config(text="Game Over")
+            self.draw()
 
     def draw_hold_piece(self):
-        self.hold_piece_canvas.delete("all")
-        if not self.hold_piece:
-            return
-        shape = self.hold_piece['shape']
-        tile_size = TILE_SIZE // 2
-        offset_x = (6 * TILE_SIZE - len(shape[0]) * tile_size) // 2
-        offset_y = (6 * TILE_SIZE - len(shape) * tile_size) // 2
-        for y, row in enumerate(shape):
-            for x, val in enumerate(row):
-                if val:
-                    self.hold_piece_canvas.create_rectangle(
-                        offset_x + x * tile_size,
-                        offset_y + y * tile_size,
-                        offset_x + (x + 1) * tile_size,
-                        offset_y + (y + 1) * tile_size,
-                        fill="cyan", outline="black"
-                    )
+        if self.authoritative:
+            return self.hold_view.render(self.server_state['hold'] if self.server_state else None)
+        return self.hold_view.render(self.game.hold_piece)
 
     def hold_current_piece(self):
-        if not self.can_hold:
-            return
-        self.can_hold = False
-        if self.hold_piece is None:
-            self.hold_piece = self.current_piece
-            self.current_piece = self.next_piece
-            self.next_piece = self.new_piece()
-        else:
-            self.hold_piece, self.current_piece = self.current_piece, self.hold_piece
-            self.current_piece['x'] = COLUMNS // 2 - len(self.current_piece['shape'][0]) // 2
-            self.current_piece['y'] = 0
-        self.draw_hold_piece()
+        self.act('hold')
 
     def draw(self):
-        self.canvas.delete("all")
-        temp_board = self.get_temp_board_with_piece()
-        for y in range(ROWS):
-            for x in range(COLUMNS):
-                if temp_board[y][x]:
-                    self.draw_tile(self.canvas, x, y, "green")
-        self.draw_next_piece()
-        self.draw_hold_piece()  # ➕ Draw hold piece
-
-    def draw_tile(self, canvas, x, y, color, tile_size=TILE_SIZE):
-        canvas.create_rectangle(
-            x*tile_size, y*tile_size,
-            (x+1)*tile_size, (y+1)*tile_size,
-            fill=color, outline="gray"
+        # Items touched this frame, to check the renderer only updates what changed
+        self.frame_touched = (
+            self.board_view.render(self.get_temp_board_with_piece())
+            + self.draw_next_piece()
+            + self.draw_hold_piece()
         )
 
-    def draw(self):
-        self.canvas.delete("all")
-        temp_board = self.get_temp_board_with_piece()
-        for y in range(ROWS):
-            for x in range(COLUMNS):
-                if temp_board[y][x]:
-                    self.draw_tile(self.canvas, x, y, "green")
-        self.draw_next_piece()
-
     def get_temp_board_with_piece(self):
-        temp_board = [row[:] for row in self.board]
-        shape = self.current_piece['shape']
-        for y, row in enumerate(shape):
-            for x, val in enumerate(row):
-                if val:
-                    px = self.current_piece['x'] + x
-                    py = self.current_piece['y'] + y
-                    if 0 <= px < COLUMNS and 0 <= py < ROWS:
-                        temp_board[py][px] = 1
-        return temp_board
-
-    def draw_opponent_board(self, board):
-        self.opponent_canvas.delete("all")
-        for y in range(ROWS):
-            for x in range(COLUMNS):
-                if board[y][x]:
-                    self.draw_tile(self.opponent_canvas, x, y, "red")
+        if self.authoritative:
+            return self.server_state['board'] if self.server_state else [0] * ROWS
+        return self.game.board_with_piece()
+
+    def opponent_tick(self):
+        # The opponent's tick now, from their last report and the time since
+        elapsed = time.monotonic() - self.opponent_piece_seen
+        return self.opponent_piece.state['tick'] + int(elapsed * 1000 / TICK_MS)
+
+    def draw_opponent_board(self, rows):
+        self.opponent_view.render(rows)
 
     def draw_next_piece(self):
-        self.next_piece_canvas.delete("all")
-        shape = self.next_piece['shape']
-        tile_size = TILE_SIZE // 2
-        offset_x = (6 * TILE_SIZE - len(shape[0]) * tile_size) // 2
-        offset_y = (6 * TILE_SIZE - len(shape) * tile_size) // 2
-        for y, row in enumerate(shape):
-            for x, val in enumerate(row):
-                if val:
-                    self.next_piece_canvas.create_rectangle(
-                        offset_x + x*tile_size,
-                        offset_y + y*tile_size,
-                        offset_x + (x+1)*tile_size,
-                        offset_y + (y+1)*tile_size,
-                        fill="purple", outline="black"
-                    )
-
-    def move(self, dx, dy):
-        self.current_piece['x'] += dx
-        self.current_piece['y'] += dy
-        if self.collision():
-            self.current_piece['x'] -= dx
-            self.current_piece['y'] -= dy
-            return False
-        return True
-
-    def rotate(self):
-        shape = self.current_piece['shape']
-        rotated = list(zip(*shape[::-1]))
-        rotated = [list(row) for row in rotated]
-        old_shape = self.current_piece['shape']
-        self.current_piece['shape'] = rotated
-        if self.collision():
-            self.current_piece['shape'] = old_shape
-
-    def collision(self):
-        shape = self.current_piece['shape']
-        for y, row in enumerate(shape):
-            for x, val in enumerate(row):
-                if val:
-                    px = self.current_piece['x'] + x
-                    py = self.current_piece['y'] + y
-                    if px < 0 or px >= COLUMNS or py >= ROWS or (py >= 0 and self.board[py][px]):
-                        return True
-        return False
-
-    def freeze(self):
-        shape = self.current_piece['shape']
-        for y, row in enumerate(shape):
-            for x, val in enumerate(row):
-                if val:
-                    px = self.current_piece['x'] + x
-                    py = self.current_piece['y'] + y
-                    if 0 <= py < ROWS:
-                        self.board[py][px] = 1
-        self.clear_lines()
-        self.current_piece = self.next_piece
-        self.next_piece = self.new_piece()
-        self.can_hold = True  # ➕ Allow holding again
-        if self.collision():
-            self.running = False
-            self.score_label.config(text="Game Over")
+        if self.authoritative:
+            return self.next_view.render(self.server_state['next'] if self.server_state else None)
+        return self.next_view.render(self.game.next_piece)
 
-    def clear_lines(self):
-        new_board = [row for row in self.board if any(val == 0 for val in row)]
-        lines_cleared = ROWS - len(new_board)
-        self.score += lines_cleared * 100
-        self.score_label.config(text=f"Your Score: {self.score}")
-        self.safe_send({"type": "score", "value": self.score})
-        for _ in range(lines_cleared):
-            new_board.insert(0, [0]*COLUMNS)
-        self.board = new_board
+    def on_lock(self, lines_cleared):
+        if lines_cleared:
+            self.score_label.config(text=f"Your Score: {self.score}")
+            self.safe_send({"type": "score", "value": self.score})
 
     def game_loop(self):
         if not self.running:
             return
-        if not self.move(0, 1):
-            self.freeze()
-        self.draw()
-
-        now = time.time()
-        if not self.is_solo and now - self.last_board_send_time > 0.5:
-            self.safe_send({"type": "board", "board": self.board})
-            self.last_board_send_time = now
-
-        self.root.after(500, self.game_loop)
+        if self.lockstep:
+            # Before stepping, so every input for this tick is included
+            update = self.input_sender.update()
+            if update:
+                self.safe_send(update)
+        events = self.game.step()
+        for event in events:
+            if event[0] == 'lock':
+                self.on_lock(event[1])
+            elif event[0] == 'game_over':
+                self.running = False
+                self.score_label.config(text="Game Over")
+                self.draw()
+        if events:
+            self.dirty = True
+
+        if not self.is_solo and self.stream_boards:
+            update = self.board_sender.update(self.game.board)
+            if update:
+                self.safe_send(update)
+            update = self.piece_sender.update(self.game)
+            if update:
+                self.safe_send(update)
+
+        self.root.after(TICK_MS, self.game_loop)
+
+    def frame_clock(self):
+        # Applies held-key repeats and draws at most once per frame, however many
+        # key events or ticks arrived since the last one
+        if not self.running:
+            return
+        now = time.monotonic()
+        for key, hold in list(self.held.items()):
+            if hold['released'] is not None and now - hold['released'] >= RELEASE_GRACE_MS / 1000:
+                del self.held[key]
+            elif now >= hold['repeat_at']:
+                self.act(HELD_ACTIONS[key])
+                hold['repeat_at'] = now + ARR_MS / 1000
+                self.dirty = True
+        if self.dirty:
+            self.dirty = False
+            self.draw()
+        self.root.after(self.frame_ms, self.frame_clock)
 
     def key_press(self, event):
-        if event.keysym == 'Left':
-            self.move(-1, 0)
-        elif event.keysym == 'Right':
-            self.move(1, 0)
-        elif event.keysym == 'Down':
-            self.move(0, 1)
+        if not self.running:
+            return
+        if event.keysym in HELD_ACTIONS:
+            hold = self.held.get(event.keysym)
+            if hold is not None:
+                # Autorepeat of a key we already track; the frame clock handles repeats
+                hold['released'] = None
+                return
+            self.held[event.keysym] = {'repeat_at': time.monotonic() + DAS_MS / 1000, 'released': None}
+            self.act(HELD_ACTIONS[event.keysym])
         elif event.keysym == 'Up':
-            self.rotate()
+            self.act('rotate')
+        elif event.keysym in ['z', 'Z']:
+            self.act('rotate_back')
+        elif event.keysym == 'space':
+            self.act('drop')
         elif event.keysym in ['Shift_L', 'Shift_R']:  # ➕ Hold on Shift
             self.hold_current_piece()
-        self.draw()
+        self.dirty = True
+
+    def key_release(self, event):
+        hold = self.held.get(event.keysym)
+        if hold is not None:
+            hold['released'] = time.monotonic()
 
     def clear_window(self):
         for widget in self.root.winfo_children():
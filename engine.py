@@ -0,0 +1,228 @@
+import random
+
+# Tetris Constants
+COLUMNS = 10
+ROWS = 20
+
+SHAPES = [
+    [[1, 1, 1], [0, 1, 0]],  # T
+    [[1, 1, 1, 1]],          # I
+    [[1, 1], [1, 1]],        # O
+    [[0, 1, 1], [1, 1, 0]],  # S
+    [[1, 1, 0], [0, 1, 1]],  # Z
+    [[1, 0, 0], [1, 1, 1]],  # L
+    [[0, 0, 1], [1, 1, 1]]   # J
+]
+
+# Each board row is an int, bit x set means column x is filled
+FULL_ROW = (1 << COLUMNS) - 1
+LINE_SCORE = 100
+
+# Offsets tried in order when a rotation collides; in place comes first so an
+# unobstructed rotation behaves exactly like the plain matrix rotation
+KICKS = ((0, 0), (-1, 0), (1, 0), (0, -1), (-1, -1), (1, -1))
+LONG_KICKS = ((0, 0), (-1, 0), (1, 0), (-2, 0), (2, 0), (-3, 0), (0, -1))
+
+
+def rotate_shape(shape):
+    return [list(row) for row in zip(*shape[::-1])]
+
+
+def shape_masks(shape):
+    return tuple(sum(1 << x for x, val in enumerate(row) if val) for row in shape)
+
+
+def build_states(shape):
+    if len(shape) == len(shape[0]):
+        kicks = KICKS[:1]
+    elif max(len(shape), len(shape[0])) == 4:
+        kicks = LONG_KICKS
+    else:
+        kicks = KICKS
+    states = []
+    for _ in range(4):
+        width = len(shape[0])
+        masks = shape_masks(shape)
+        # Row masks already shifted to every legal column, so a probe is a lookup
+        shifted = tuple(tuple(m << x for m in masks) for x in range(COLUMNS - width + 1))
+        # Lowest and highest filled cell of every piece column, for surface drops
+        bottoms = tuple(max(y for y, row in enumerate(shape) if row[x]) for x in range(width))
+        tops = tuple(min(y for y, row in enumerate(shape) if row[x]) for x in range(width))
+        cells = tuple((x, y) for y, row in enumerate(shape) for x, val in enumerate(row) if val)
+        states.append({'shape': shape, 'masks': masks, 'shifted': shifted, 'cells': cells,
+                       'width': width, 'height': len(shape), 'bottoms': bottoms, 'tops': tops,
+                       'kicks': {1: kicks, -1: tuple((-dx, dy) for dx, dy in kicks)}})
+        shape = rotate_shape(shape)
+    return tuple(states)
+
+
+PIECE_STATES = tuple(build_states(shape) for shape in SHAPES)
+
+# Hot-path views of PIECE_STATES indexed [kind][rot], so a probe doesn't
+# pay for a dict lookup per field
+SHIFTED = tuple(tuple(state['shifted'] for state in states) for states in PIECE_STATES)
+LOWEST_Y = tuple(tuple(ROWS - state['height'] for state in states) for states in PIECE_STATES)
+SPAWN_X = tuple(COLUMNS // 2 - states[0]['width'] // 2 for states in PIECE_STATES)
+
+
+def spawn_x(kind):
+    return SPAWN_X[kind]
+
+
+def board_to_matrix(rows):
+    return [[(row >> x) & 1 for x in range(COLUMNS)] for row in rows]
+
+
+def matrix_to_board(matrix):
+    return [sum(1 << x for x, val in enumerate(row) if val) for row in matrix]
+
+
+class Engine:
+    def __init__(self, rng=None):
+        self.rng = rng or random.Random()
+        self.board = [0] * ROWS
+        self.surface = [ROWS] * COLUMNS  # highest filled row of every column
+        self.score = 0
+        self.lines = 0
+
+    def set_board(self, rows):
+        self.board = list(rows)
+        self.update_surface()
+
+    def update_surface(self):
+        surface = [ROWS] * COLUMNS
+        seen = 0
+        for y, row in enumerate(self.board):
+            new = row & ~seen
+            if new:
+                seen |= new
+                for x in range(COLUMNS):
+                    if new >> x & 1:
+                        surface[x] = y
+                if seen == FULL_ROW:
+                    break
+        self.surface = surface
+
+    def new_piece(self, kind=None):
+        if kind is None:
+            kind = self.rng.randrange(len(SHAPES))
+        return {'kind': kind, 'rot': 0, 'x': SPAWN_X[kind], 'y': 0}
+
+    def state(self, piece):
+        return PIECE_STATES[piece['kind']][piece['rot']]
+
+    def shape(self, piece):
+        return self.state(piece)['shape']
+
+    def fits(self, kind, rot, x, y):
+        shifted = SHIFTED[kind][rot]
+        if x < 0 or x >= len(shifted) or y > LOWEST_Y[kind][rot]:
+            return False
+        board = self.board
+        for mask in shifted[x]:
+            if y >= 0 and board[y] & mask:
+                return False
+            y += 1
+        return True
+
+    def collision(self, piece):
+        return not self.fits(piece['kind'], piece['rot'], piece['x'], piece['y'])
+
+    def move(self, piece, dx, dy):
+        # fits() inlined: gravity calls this once per row for every piece
+        x = piece['x'] + dx
+        y = piece['y'] + dy
+        kind = piece['kind']
+        rot = piece['rot']
+        shifted = SHIFTED[kind][rot]
+        if x < 0 or x >= len(shifted) or y > LOWEST_Y[kind][rot]:
+            return False
+        board = self.board
+        row = y
+        for mask in shifted[x]:
+            if row >= 0 and board[row] & mask:
+                return False
+            row += 1
+        piece['x'] = x
+        piece['y'] = y
+        return True
+
+    def rotate(self, piece, direction=1):
+        kind = piece['kind']
+        rot = (piece['rot'] + direction) % 4
+        x = piece['x']
+        y = piece['y']
+        for dx, dy in PIECE_STATES[kind][piece['rot']]['kicks'][direction]:
+            if self.fits(kind, rot, x + dx, y + dy):
+                piece['rot'] = rot
+                piece['x'] = x + dx
+                piece['y'] = y + dy
+                return True
+        return False
+
+    def drop(self, piece):
+        state = PIECE_STATES[piece['kind']][piece['rot']]
+        x = piece['x']
+        y = piece['y']
+        surface = self.surface
+        landing = ROWS
+        for c, bottom in enumerate(state['bottoms'], x):
+            top = surface[c] - 1 - bottom
+            if top < y:
+                break
+            if top < landing:
+                landing = top
+        else:
+            # Piece is above every column it covers, so it lands on the surface
+            piece['y'] = landing
+            return
+        masks = state['shifted'][x]
+        board = self.board
+        bottom = LOWEST_Y[piece['kind']][piece['rot']]
+        while y < bottom:
+            row = y + 1
+            for mask in masks:
+                if row >= 0 and board[row] & mask:
+                    piece['y'] = y
+                    return
+                row += 1
+            y += 1
+        piece['y'] = y
+
+    def lock(self, piece):
+        y = piece['y']
+        board = self.board
+        state = PIECE_STATES[piece['kind']][piece['rot']]
+        x = piece['x']
+        full = False
+        surface = self.surface
+        for c, top in enumerate(state['tops'], x):
+            top += y
+            if top < surface[c]:
+                surface[c] = top if top > 0 else 0
+        for mask in state['shifted'][x]:
+            if y >= 0:
+                row = board[y] | mask
+                board[y] = row
+                if row == FULL_ROW:
+                    full = True
+            y += 1
+        return self.clear_lines() if full else 0
+
+    def clear_lines(self):
+        kept = [row for row in self.board if row != FULL_ROW]
+        cleared = ROWS - len(kept)
+        if cleared:
+            self.board = [0] * cleared + kept
+            self.update_surface()
+            self.score += cleared * LINE_SCORE
+            self.lines += cleared
+        return cleared
+
+    def board_with_piece(self, piece):
+        rows = self.board[:]
+        y = piece['y']
+        for i, mask in enumerate(self.state(piece)['shifted'][piece['x']]):
+            if 0 <= y + i < ROWS:
+                rows[y + i] |= mask
+        return rows
@@ -8,6 +8,61 @@ import queue
 import pygame
 import os
 from tkinter import messagebox
+from userstore import UserStore, LEGACY_FILE
+from scorelog import ScoreLog
+
+
+# A piece's kind is its index here
+SHAPES = [
+    [[1, 1, 1], [0, 1, 0]],
+    [[1, 1, 1, 1]],
+    [[1, 1], [1, 1]],
+    [[0, 1, 1], [1, 1, 0]],
+    [[1, 1, 0], [0, 1, 1]],
+    [[1, 0, 0], [1, 1, 1]],
+    [[0, 0, 1], [1, 1, 1]]
+]
+
+
+class PieceBag:
+    # 7-bag randomizer: every run of seven pieces has each shape once. Both
+    # players seed it from the server's 'start' message, so each side can
+    # work out the other's pieces without them being sent.
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+        self.bag = []
+        self.drawn = 0
+
+    def draw(self):
+        if not self.bag:
+            self.bag = list(range(len(SHAPES)))
+            self.rng.shuffle(self.bag)
+        self.drawn += 1
+        return self.bag.pop()
+
+
+class OpponentPieces:
+    # The opponent's current, next and hold kinds, replayed from their bag.
+    # Only hold toggles and the count of pieces they have drawn come over the wire.
+    def __init__(self, seed):
+        self.bag = PieceBag(seed)
+        self.current = self.bag.draw()
+        self.next = self.bag.draw()
+        self.hold = None
+
+    def lock(self):
+        self.current, self.next = self.next, self.bag.draw()
+
+    def toggle_hold(self):
+        if self.hold is None:
+            self.hold = self.current
+            self.lock()
+        else:
+            self.hold, self.current = self.current, self.hold
+
+    def catch_up(self, drawn):
+        while self.bag.drawn < drawn:
+            self.lock()
 
 
 class TetrisClient:
@@ -48,6 +103,9 @@ class TetrisClient:
         self.board = []
         self.current_piece = None
         self.next_piece = None
+        self.seed = None
+        self.piece_bag = None
+        self.opponent_pieces = None
         self.score = 0
         self.server_ip = '127.0.0.1'
         self.server_port = 5555
@@ -58,38 +116,29 @@ class TetrisClient:
         self.FONT_LABEL = (self.FONT_NAME, 12)
         self.FONT_BUTTON = (self.FONT_NAME, 10, "bold")
 
-        # Create files if they don't exist
-        if not os.path.exists('users.txt'):
-            with open('users.txt', 'w') as f:
-                pass
-        if not os.path.exists('highscores.txt'):
-            with open('highscores.txt', 'w') as f:
-                pass
-        else:
-            self.load_high_scores()
+        # Accounts live in users.db. Importing a users.txt from before hashes
+        # every password, far too slow for startup, so it's left to the CLI
+        self.users = UserStore()
+        if self.users.is_empty() and os.path.exists(LEGACY_FILE):
+            print(f"Found {LEGACY_FILE}; run 'python userstore.py' once to import its accounts")
+
+        # Best scores are appended to a journal and replayed over the last
+        # snapshot; high_scores is the log's own dict
+        self.load_high_scores()
 
         self.show_login_screen()
         self.connect_to_server()
 
         self.root.mainloop()
+        self.score_log.close()
 
     def load_high_scores(self):
-        try:
-            with open('highscores.txt', 'r') as f:
-                for line in f:
-                    parts = line.strip().split(':')
-                    if len(parts) == 2:
-                        username, score = parts
-                        self.high_scores[username] = int(score)
-        except:
-            pass
+        self.score_log = ScoreLog()
+        self.high_scores = self.score_log.scores
 
     def save_high_score(self):
-        if self.username and self.score > self.high_scores.get(self.username, 0):
-            self.high_scores[self.username] = self.score
-            with open('highscores.txt', 'w') as f:
-                for username, score in self.high_scores.items():
-                    f.write(f"{username}:{score}\n")
+        if self.username:
+            self.score_log.record(self.username, self.score)
 
     def show_high_scores(self):
         self.high_scores_window = tk.Toplevel(self.root)
@@ -194,18 +243,12 @@ class TetrisClient:
             messagebox.showerror("Error", "Username and password are required")
             return
 
-        # Check credentials in the text file
-        with open('users.txt', 'r') as f:
-            for line in f:
-                parts = line.strip().split(':')
-                if len(parts) == 2:
-                    stored_user, stored_pass = parts
-                    if stored_user == username and stored_pass == password:
-                        self.username = username
-                        self.password = password
-                        self.safe_send({"type": "join", "username": username})
-                        self.lobby_screen()
-                        return
+        if self.users.check(username, password):
+            self.username = username
+            self.password = password
+            self.safe_send({"type": "join", "username": username})
+            self.lobby_screen()
+            return
 
         messagebox.showerror("Error", "Invalid username or password")
 
@@ -222,17 +265,9 @@ class TetrisClient:
             messagebox.showerror("Error", "Passwords do not match")
             return
 
-        # Check if username already exists
-        with open('users.txt', 'r') as f:
-            for line in f:
-                parts = line.strip().split(':')
-                if len(parts) > 0 and parts[0] == username:
-                    messagebox.showerror("Error", "Username already exists")
-                    return
-
-        # Add new user
-        with open('users.txt', 'a') as f:
-            f.write(f"{username}:{password}\n")
+        if not self.users.register(username, password):
+            messagebox.showerror("Error", "Username already exists")
+            return
 
         messagebox.showinfo("Success", "Registration successful!")
         self.show_login_screen()
@@ -271,6 +306,7 @@ class TetrisClient:
 
     def force_start(self):
         self.is_solo = True
+        self.seed = None
         self.ready = True  # Mark as ready for solo mode
         self.countdown_and_start()
 
@@ -302,17 +338,16 @@ class TetrisClient:
 
                     self.is_solo = msg.get('is_solo', False)
                     if not self.is_solo:
-
-                        if 'opponent_next' in msg:
-                            self.opponent_next_piece = msg['opponent_next']
-
-                        if 'opponent_hold' in msg:
-                            self.opponent_hold_piece = msg['opponent_hold']
-                            self.root.after(0, self.start_game)
+                        self.seed = msg.get('seed')
+                        self.root.after(0, self.start_game)
 
                 elif msg['type'] == 'score' and not self.is_solo:
                     if self.opponent_score_label:
                         self.opponent_score_label.config(text=f"Opponent Score: {msg['value']}")
+                    # Sent after every lock, with how many pieces the opponent has drawn
+                    if self.opponent_pieces and msg.get('pieces') is not None:
+                        self.opponent_pieces.catch_up(msg['pieces'])
+                        self.root.after(0, self.show_opponent_pieces)
 
                 elif msg['type'] == 'board' and not self.is_solo:
                     if self.opponent_canvas:
@@ -325,13 +360,10 @@ class TetrisClient:
                     self.root.after(0, self.cancel_countdown)
                     self.root.after(0, self.status_label.config, {"text": "Game cancelled - other player left"})
 
-                elif msg['type'] == 'opponent_next':
-                    self.opponent_next_piece = msg['piece']
-                    self.draw_opponent_next_piece()
-
-                elif msg['type'] == 'opponent_hold':
-                    self.opponent_hold_piece = msg['piece']
-                    self.draw_opponent_hold_piece()
+                elif msg['type'] == 'opponent_hold' and self.opponent_pieces:
+                    self.opponent_pieces.toggle_hold()
+                    self.opponent_pieces.catch_up(msg['pieces'])
+                    self.root.after(0, self.show_opponent_pieces)
 
 
             except Exception as e:
@@ -468,6 +500,7 @@ class TetrisClient:
 
         # Initialize game state
         self.board = [[0] * 10 for _ in range(20)]
+        self.piece_bag = PieceBag(self.seed)
         self.current_piece = self.new_piece()
         self.next_piece = self.new_piece()
         self.score = 0
@@ -478,30 +511,29 @@ class TetrisClient:
         self.opponent_board = [[0] * 10 for _ in range(20)]
         self.opponent_next_piece = None
         self.opponent_hold_piece = None
+        self.opponent_pieces = None
 
         if not self.is_solo:
-            self.safe_send({
-                'type': 'initial_pieces',
-                'next_piece': self.next_piece,
-                'hold_piece': self.hold_piece
-            })
+            # Same seed, same bag: the opponent starts with the pieces we do
+            self.opponent_pieces = OpponentPieces(self.seed)
+            self.show_opponent_pieces()
 
         self.root.bind("<Key>", self.key_press)
         self.game_loop()
 
     def new_piece(self):
-        shapes = [
-            [[1, 1, 1], [0, 1, 0]],
-            [[1, 1, 1, 1]],
-            [[1, 1], [1, 1]],
-            [[0, 1, 1], [1, 1, 0]],
-            [[1, 1, 0], [0, 1, 1]],
-            [[1, 0, 0], [1, 1, 1]],
-            [[0, 0, 1], [1, 1, 1]]
-        ]
-        shape = random.choice(shapes)
+        shape = SHAPES[self.piece_bag.draw()]
         return {'shape': shape, 'x': 5 - len(shape[0]) // 2, 'y': 0}
 
+    def show_opponent_pieces(self):
+        pieces = self.opponent_pieces
+        if not pieces:
+            return
+        self.opponent_next_piece = {'shape': SHAPES[pieces.next]}
+        self.opponent_hold_piece = {'shape': SHAPES[pieces.hold]} if pieces.hold is not None else None
+        self.draw_opponent_next_piece()
+        self.draw_opponent_hold_piece()
+
     def draw_hold_piece(self):
         if self.hold_piece_canvas:
             self.hold_piece_canvas.delete("all")
@@ -536,16 +568,9 @@ class TetrisClient:
             self.current_piece['x'] = 5 - len(self.current_piece['shape'][0]) // 2
             self.current_piece['y'] = 0
 
-        # Send updates to opponent
+        # The opponent derives both pieces from the shared bag
         if not self.is_solo:
-            self.safe_send({
-                'type': 'hold_piece',
-                'piece': self.hold_piece
-            })
-            self.safe_send({
-                'type': 'next_piece',
-                'piece': self.next_piece
-            })
+            self.safe_send({'type': 'hold', 'pieces': self.piece_bag.drawn})
 
         self.draw_hold_piece()
 
@@ -685,11 +710,10 @@ class TetrisClient:
         self.next_piece = self.new_piece()
         self.can_hold = True
 
+        # Only send score updates in multiplayer mode; the piece count lets
+        # the opponent advance our next piece
         if not self.is_solo:
-            self.safe_send({
-                'type': 'next_piece',
-                'piece': self.next_piece
-            })
+            self.safe_send({"type": "score", "value": self.score, "pieces": self.piece_bag.drawn})
 
         if self.collision():
             self.running = False
@@ -705,10 +729,6 @@ class TetrisClient:
         if self.score_label:
             self.score_label.config(text=f"Your Score: {self.score}")
 
-        # Only send score updates in multiplayer mode
-        if not self.is_solo:
-            self.safe_send({"type": "score", "value": self.score})
-
         for _ in range(lines_cleared):
             new_board.insert(0, [0] * 10)
         self.board = new_board
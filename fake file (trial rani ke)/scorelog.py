@@ -0,0 +1,129 @@
+import contextlib
+import os
+import threading
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+    import fcntl
+
+# The compacted snapshot keeps the old highscores.txt format, so an existing
+# file is simply the first snapshot
+SNAPSHOT_FILE = 'highscores.txt'
+LOG_FILE = 'highscores.log'
+
+COMPACT_BYTES = 64 * 1024  # fold the log into the snapshot past this size
+FSYNC_INTERVAL = 1.0       # seconds; appends within it share one fsync
+
+
+def read_scores(path, scores):
+    # Merges user:score lines into scores, keeping each user's best. Taking
+    # the max makes replay order-independent, so entries appended by other
+    # clients sharing the files can't undo each other.
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                parts = line.strip().split(':')
+                if len(parts) == 2 and parts[1].isdigit():
+                    username, score = parts[0], int(parts[1])
+                    if score > scores.get(username, -1):
+                        scores[username] = score
+    except FileNotFoundError:
+        pass
+    return scores
+
+
+@contextlib.contextmanager
+def file_lock(f):
+    # Exclusive lock across processes on an open lock file
+    if msvcrt:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ScoreLog:
+    # Personal bests kept as an append-only journal on top of a snapshot.
+    # A new best costs one appended line; fsyncs are batched, and once the
+    # journal grows past COMPACT_BYTES a background thread folds it into a
+    # fresh snapshot. Several clients can share the files: appends and
+    # compaction hold a lock file, so the log is never emptied while
+    # another process is writing to it.
+    def __init__(self, snapshot=SNAPSHOT_FILE, log=LOG_FILE):
+        self.snapshot = snapshot
+        self.log_path = log
+        self.lock = threading.Lock()
+        self.lock_file = open(log + '.lock', 'a+')
+        self.sync_pending = False
+        self.compacting = False
+        with file_lock(self.lock_file):
+            self.scores = read_scores(log, read_scores(snapshot, {}))
+        self.log = open(log, 'a')
+
+    def record(self, username, score):
+        # Returns True if score is a new best for username
+        if score <= self.scores.get(username, 0):
+            return False
+        self.scores[username] = score
+        with self.lock, file_lock(self.lock_file):
+            self.log.write(f"{username}:{score}\n")
+            # Flushed now so a crash of this process loses nothing; the
+            # fsync against power loss waits for the batch
+            self.log.flush()
+            size = os.fstat(self.log.fileno()).st_size
+            if not self.sync_pending:
+                self.sync_pending = True
+                timer = threading.Timer(FSYNC_INTERVAL, self.sync)
+                timer.daemon = True
+                timer.start()
+        if size > COMPACT_BYTES and not self.compacting:
+            self.compacting = True
+            threading.Thread(target=self.compact, daemon=True).start()
+        return True
+
+    def sync(self):
+        with self.lock:
+            self.sync_pending = False
+            if not self.log.closed:
+                self.log.flush()
+                os.fsync(self.log.fileno())
+
+    def compact(self):
+        # The log is emptied in place rather than renamed: every client has
+        # it open in append mode, so their next write lands in the new log
+        tmp = f"{self.snapshot}.{os.getpid()}.tmp"
+        try:
+            with self.lock, file_lock(self.lock_file):
+                # Another client may have compacted while this one waited
+                if os.fstat(self.log.fileno()).st_size <= COMPACT_BYTES:
+                    return
+                scores = read_scores(self.log_path, read_scores(self.snapshot, {}))
+                with open(tmp, 'w') as f:
+                    for username, score in scores.items():
+                        f.write(f"{username}:{score}\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.snapshot)
+                self.log.truncate(0)
+                os.fsync(self.log.fileno())
+        except OSError as e:
+            print("Error compacting high scores:", e)
+        finally:
+            self.compacting = False
+
+    def close(self):
+        self.sync()
+        with self.lock:
+            self.log.close()
+            self.lock_file.close()
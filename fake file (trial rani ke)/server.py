@@ -1,6 +1,7 @@
 import socket
 import threading
 import json
+import random
 import time
 
 
@@ -72,44 +73,14 @@ def handle_client(conn, addr):
                     pass
 
             elif msg['type'] == 'score':
-                broadcast({'type': 'score', 'value': msg['value']}, sender_conn=conn)
+                broadcast({'type': 'score', 'value': msg['value'], 'pieces': msg.get('pieces')}, sender_conn=conn)
 
             elif msg['type'] == 'board':
                 broadcast({'type': 'board', 'board': msg['board']}, sender_conn=conn)
 
-            elif msg['type'] == 'next_piece':
-
-                with lock:
-                    opponent = next((c for c in clients if c['conn'] != conn), None)
-                    if opponent:
-                        try:
-                            opponent['conn'].send(json.dumps({
-                                'type': 'opponent_next',
-                                'piece': msg['piece']
-                            }).encode())
-                        except:
-                            pass
-
-            elif msg['type'] == 'hold_piece':
-                # Broadcast the player's hold piece to opponent
-                with lock:
-                    opponent = next((c for c in clients if c['conn'] != conn), None)
-                    if opponent:
-                        try:
-                            opponent['conn'].send(json.dumps({
-                                'type': 'opponent_hold',
-                                'piece': msg['piece']
-                            }).encode())
-                        except:
-                            pass
-            elif msg['type'] == 'initial_pieces':
-                with lock:
-                    # Update this client's piece information
-                    for client in clients:
-                        if client['conn'] == conn:
-                            client['next_piece'] = msg.get('next_piece')
-                            client['hold_piece'] = msg.get('hold_piece')
-                            break
+            elif msg['type'] == 'hold':
+                # Pieces come from the shared bag, so only the toggle is relayed
+                broadcast({'type': 'opponent_hold', 'pieces': msg['pieces']}, sender_conn=conn)
 
     except Exception as e:
         print(f"Error handling client {addr}: {e}")
@@ -155,28 +126,15 @@ def start_game_with_countdown():
             broadcast({'type': 'countdown', 'value': i})
             time.sleep(1)
 
-        # After countdown, exchange initial pieces
+        # After countdown, both players get the seed for the shared 7-bag
         with lock:
             if len(clients) == 2:
-                client1, client2 = clients[0], clients[1]
-
-                # Send each client their opponent's initial pieces
-                try:
-                    client1['conn'].send(json.dumps({
-                        'type': 'start',
-                        'is_solo': False,
-                        'opponent_next': client2.get('next_piece'),
-                        'opponent_hold': client2.get('hold_piece')
-                    }).encode())
-
-                    client2['conn'].send(json.dumps({
-                        'type': 'start',
-                        'is_solo': False,
-                        'opponent_next': client1.get('next_piece'),
-                        'opponent_hold': client1.get('hold_piece')
-                    }).encode())
-                except:
-                    pass
+                start = json.dumps({'type': 'start', 'is_solo': False, 'seed': random.randrange(2 ** 32)}).encode()
+                for client in clients:
+                    try:
+                        client['conn'].send(start)
+                    except:
+                        pass
     except:
         pass
     finally:
@@ -0,0 +1,79 @@
+import hashlib
+import hmac
+import os
+import sqlite3
+import sys
+
+DB_FILE = 'users.db'
+LEGACY_FILE = 'users.txt'
+
+# PBKDF2 rounds per password check; high enough to slow guessing, low
+# enough that a login doesn't visibly stall the Tk thread
+HASH_ITERATIONS = 100000
+SALT_BYTES = 16
+
+
+def hash_password(password, salt):
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, HASH_ITERATIONS)
+
+
+class UserStore:
+    # Accounts in sqlite instead of users.txt: username is the primary key,
+    # so login and registration are index lookups rather than a scan of every
+    # line, and only salted hashes are stored. One connection is opened and
+    # reused for the life of the client.
+    def __init__(self, path=DB_FILE):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            "username TEXT PRIMARY KEY, salt BLOB NOT NULL, hash BLOB NOT NULL)"
+        )
+        self.conn.commit()
+
+    def register(self, username, password):
+        # Returns False if the username is taken
+        salt = os.urandom(SALT_BYTES)
+        try:
+            with self.conn:
+                self.conn.execute("INSERT INTO users VALUES (?, ?, ?)",
+                                  (username, salt, hash_password(password, salt)))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def check(self, username, password):
+        row = self.conn.execute("SELECT salt, hash FROM users WHERE username = ?", (username,)).fetchone()
+        if row is None:
+            return False
+        salt, stored = row
+        return hmac.compare_digest(hash_password(password, salt), stored)
+
+    def is_empty(self):
+        return self.conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None
+
+    def import_file(self, path=LEGACY_FILE):
+        # One-shot import of a plaintext user:pass file; accounts that already
+        # exist are left alone. Returns how many were added.
+        accounts = []
+        with open(path, 'r') as f:
+            for line in f:
+                parts = line.strip().split(':')
+                if len(parts) == 2 and parts[0]:
+                    salt = os.urandom(SALT_BYTES)
+                    accounts.append((parts[0], salt, hash_password(parts[1], salt)))
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany("INSERT OR IGNORE INTO users VALUES (?, ?, ?)", accounts)
+            return self.conn.total_changes - before
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    # python userstore.py [users.txt [users.db]]
+    source = sys.argv[1] if len(sys.argv) > 1 else LEGACY_FILE
+    store = UserStore(sys.argv[2] if len(sys.argv) > 2 else DB_FILE)
+    print(f"Imported {store.import_file(source)} accounts from {source}")
+    store.close()
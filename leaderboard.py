@@ -0,0 +1,109 @@
+import bisect
+
+# Entries per bucket; a bucket that grows to twice this is split in half
+BUCKET_SIZE = 1000
+
+
+class Leaderboard:
+    # Each player's best score, kept in order as a list of sorted buckets of
+    # (-score, name). An update bisects to one bucket and shifts at most
+    # 2 * BUCKET_SIZE entries, so it never touches the whole board. Top-K
+    # reads the first buckets in order, and a player's rank is a bisect plus
+    # the entries in the buckets before theirs, summed from a Fenwick tree
+    # over bucket sizes. The tree is only rebuilt when a bucket is split or
+    # emptied.
+    def __init__(self):
+        self.scores = {}
+        self.buckets = []
+        self.maxes = []  # last key of each bucket, to bisect for the bucket
+        self.tree = None  # Fenwick tree of bucket sizes, None when stale
+
+    def __len__(self):
+        return len(self.scores)
+
+    def submit(self, name, score):
+        # Keeps the player's best; returns True if the board changed
+        old = self.scores.get(name)
+        if old is not None and score <= old:
+            return False
+        # Inserted first, so a score that can't be ordered changes nothing
+        self.insert((-score, name))
+        if old is not None:
+            self.remove((-old, name))
+        self.scores[name] = score
+        return True
+
+    def insert(self, key):
+        buckets = self.buckets
+        maxes = self.maxes
+        if not buckets:
+            buckets.append([key])
+            maxes.append(key)
+            self.tree = None
+            return
+        i = min(bisect.bisect_left(maxes, key), len(buckets) - 1)
+        bucket = buckets[i]
+        bisect.insort(bucket, key)
+        maxes[i] = bucket[-1]
+        if len(bucket) >= 2 * BUCKET_SIZE:
+            buckets.insert(i + 1, bucket[BUCKET_SIZE:])
+            del bucket[BUCKET_SIZE:]
+            maxes.insert(i, bucket[-1])
+            self.tree = None
+        else:
+            self.count(i, 1)
+
+    def remove(self, key):
+        i = bisect.bisect_left(self.maxes, key)
+        bucket = self.buckets[i]
+        del bucket[bisect.bisect_left(bucket, key)]
+        if bucket:
+            self.maxes[i] = bucket[-1]
+            self.count(i, -1)
+        else:
+            del self.buckets[i]
+            del self.maxes[i]
+            self.tree = None
+
+    def count(self, i, delta):
+        tree = self.tree
+        if tree is None:
+            return
+        i += 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def before(self, i):
+        # Entries in buckets[:i]
+        tree = self.tree
+        if tree is None:
+            tree = self.tree = [0, *map(len, self.buckets)]
+            for j in range(1, len(tree)):
+                parent = j + (j & -j)
+                if parent < len(tree):
+                    tree[parent] += tree[j]
+        total = 0
+        while i:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def top(self, count):
+        # [(name, score), ...] best first
+        entries = []
+        for bucket in self.buckets:
+            for score, name in bucket[:count - len(entries)]:
+                entries.append((name, -score))
+            if len(entries) >= count:
+                break
+        return entries
+
+    def rank(self, name):
+        # 1-based position, or None for a player with no score
+        score = self.scores.get(name)
+        if score is None:
+            return None
+        key = (-score, name)
+        i = bisect.bisect_left(self.maxes, key)
+        return self.before(i) + bisect.bisect_left(self.buckets[i], key) + 1
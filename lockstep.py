@@ -0,0 +1,65 @@
+import zlib
+from collections import deque
+
+from runner import Game, ACTIONS, GRAVITY_TICKS
+
+# Every HASH_EVERY ticks an input message carries a hash of the sender's
+# game, so a peer simulating it can tell when the two have drifted apart
+HASH_EVERY = 100
+
+
+def state_hash(game):
+    piece = game.current_piece
+    fields = list(game.board) + [piece['kind'], piece['rot'], piece['x'], piece['y'], game.score]
+    return zlib.crc32(','.join(map(str, fields)).encode())
+
+
+class InputSender:
+    # Turns a local Game's input log into 'inputs' messages. Call update()
+    # before each step: every input for ticks up to game.tick is then final.
+    # Messages go out when there are inputs, and at least once per gravity
+    # period so the peer can advance through ticks nobody pressed anything on.
+    def __init__(self, game):
+        self.game = game
+        self.sent = 0
+
+    def update(self):
+        game = self.game
+        tick = game.tick
+        if len(game.inputs) == self.sent and tick % GRAVITY_TICKS:
+            return None
+        actions = [[t, ACTIONS.index(action)] for t, action in game.inputs[self.sent:]]
+        self.sent = len(game.inputs)
+        msg = {'type': 'inputs', 'tick': tick, 'actions': actions}
+        if tick % HASH_EVERY == 0:
+            msg['hash'] = state_hash(game)
+        return msg
+
+
+class OpponentSim:
+    # Replays a peer's inputs on a Game with the same seed, so the opponent
+    # view is simulated locally instead of shipped as boards
+    def __init__(self, seed):
+        self.game = Game(seed)
+        self.pending = deque()
+        self.desynced = False
+
+    def apply(self, msg):
+        # Returns True the first time the peer's hash disagrees with ours,
+        # which is when the caller should fall back to board updates
+        if self.desynced:
+            return False
+        game = self.game
+        pending = self.pending
+        pending.extend(msg['actions'])
+        while game.running and game.tick <= msg['tick']:
+            while pending and pending[0][0] <= game.tick:
+                game.apply(ACTIONS[pending.popleft()[1]])
+            if game.tick == msg['tick']:
+                if 'hash' in msg and msg['hash'] != state_hash(game):
+                    self.desynced = True
+                    return True
+                game.step()
+                break
+            game.step()
+        return False
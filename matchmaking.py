@@ -0,0 +1,98 @@
+import bisect
+import itertools
+import time
+
+DEFAULT_RATING = 1000
+MIN_RATING = 0
+MAX_RATING = 5000
+
+# How far apart two ratings may be, growing with the longer wait in the pair
+BASE_WINDOW = 50
+WIDEN_PER_SECOND = 25
+MAX_WINDOW = 500
+
+
+def window(waited):
+    return min(MAX_WINDOW, BASE_WINDOW + WIDEN_PER_SECOND * waited)
+
+
+def parse_rating(value):
+    # Ratings come from clients; anything that isn't a number gets the default
+    try:
+        rating = int(value)
+    except (TypeError, ValueError, OverflowError):
+        return DEFAULT_RATING
+    return max(MIN_RATING, min(rating, MAX_RATING))
+
+
+class MatchQueue:
+    # Waiting players kept in a list sorted by (rating, ticket), so the closest
+    # opponents of anyone in the queue are their neighbours in the index and
+    # are found with one bisect instead of a scan over every connection.
+    # Tickets are unique and break rating ties in arrival order.
+    def __init__(self):
+        self.index = []
+        self.waiting = {}  # id(player) -> (rating, ticket, since), oldest first
+        self.players = {}  # ticket -> player
+        self.tickets = itertools.count()
+
+    def __len__(self):
+        return len(self.waiting)
+
+    def __contains__(self, player):
+        return id(player) in self.waiting
+
+    def add(self, player, rating=DEFAULT_RATING, now=None):
+        if id(player) in self.waiting:
+            return
+        ticket = next(self.tickets)
+        # Indexed first, so a rating that can't be ordered leaves no half-added entry
+        bisect.insort(self.index, (rating, ticket))
+        self.waiting[id(player)] = (rating, ticket, time.monotonic() if now is None else now)
+        self.players[ticket] = player
+
+    def remove(self, player):
+        entry = self.waiting.pop(id(player), None)
+        if entry is None:
+            return False
+        rating, ticket, since = entry
+        del self.players[ticket]
+        del self.index[bisect.bisect_left(self.index, (rating, ticket))]
+        return True
+
+    def find_match(self, player, now=None):
+        # Pairs player with the closest waiting rating inside the window and
+        # takes both out of the queue; returns the opponent or None
+        entry = self.waiting.get(id(player))
+        if entry is None:
+            return None
+        rating, ticket, since = entry
+        position = bisect.bisect_left(self.index, (rating, ticket))
+        best = None
+        for neighbour in (position - 1, position + 1):
+            if 0 <= neighbour < len(self.index):
+                other = self.index[neighbour]
+                if best is None or abs(other[0] - rating) < abs(best[0] - rating):
+                    best = other
+        if best is None:
+            return None
+        opponent = self.players[best[1]]
+        now = time.monotonic() if now is None else now
+        waited = now - min(since, self.waiting[id(opponent)][2])
+        if abs(best[0] - rating) > window(waited):
+            return None
+        self.remove(player)
+        self.remove(opponent)
+        return opponent
+
+    def match_all(self, now=None):
+        # Oldest players first: their windows are the widest
+        now = time.monotonic() if now is None else now
+        pairs = []
+        for ticket in [entry[1] for entry in self.waiting.values()]:
+            player = self.players.get(ticket)
+            if player is not None:
+                opponent = self.find_match(player, now)
+                if opponent is not None:
+                    pairs.append((player, opponent))
+        return pairs
@@ -0,0 +1,64 @@
+import asyncio
+from collections import deque
+
+OUTBOX_LIMIT = 256
+
+# What to do with a frame that arrives while the outbox is full
+COALESCE = 'coalesce'      # replace pending frames it supersedes, otherwise drop it
+DROP = 'drop'              # drop the new frame
+DISCONNECT = 'disconnect'  # give up on the slow consumer
+POLICIES = (COALESCE, DROP, DISCONNECT)
+
+
+class Outbox:
+    # Bounded per-connection queue of encoded frames, drained by one writer task.
+    # Frames may carry a key; a frame put with supersedes=True makes every
+    # pending frame with the same key obsolete.
+    def __init__(self, limit=OUTBOX_LIMIT, policy=COALESCE):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        self.limit = limit
+        self.policy = policy
+        self.frames = deque()
+        self.ready = asyncio.Event()
+        self.high_water = 0
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.overflowed = False
+
+    def __len__(self):
+        return len(self.frames)
+
+    def put(self, frame, key=None, supersedes=False):
+        # Returns False once the consumer should be disconnected
+        if self.overflowed:
+            return False
+        if len(self.frames) >= self.limit:
+            if self.policy == DISCONNECT:
+                self.overflowed = True
+                return False
+            if self.policy == COALESCE and supersedes and key is not None:
+                kept = deque(item for item in self.frames if item[1] != key)
+                self.coalesced += len(self.frames) - len(kept)
+                self.frames = kept
+            if len(self.frames) >= self.limit:
+                self.dropped += 1
+                return True
+        self.frames.append((frame, key))
+        self.high_water = max(self.high_water, len(self.frames))
+        self.ready.set()
+        return True
+
+    async def get_all(self):
+        while not self.frames:
+            self.ready.clear()
+            await self.ready.wait()
+        frames = [frame for frame, key in self.frames]
+        self.frames.clear()
+        self.sent += len(frames)
+        return frames
+
+    def stats(self):
+        return {'depth': len(self.frames), 'high_water': self.high_water, 'sent': self.sent,
+                'dropped': self.dropped, 'coalesced': self.coalesced}
@@ -0,0 +1,313 @@
+import json
+import struct
+
+from engine import COLUMNS, ROWS
+
+# Every message on the wire is a 4-byte big-endian length followed by that many payload bytes
+HEADER = struct.Struct('!I')
+MAX_FRAME = 1 << 20
+
+# A payload is either JSON text (always starts with '{') or a binary message
+# whose first byte is its type id. Both can arrive on the same connection, so
+# JSON stays usable for debugging and for messages without a binary layout.
+JSON_MARK = ord('{')
+
+BOARD_BYTES = (COLUMNS * ROWS + 7) // 8
+NO_PIECE = 0xFF
+
+U8 = struct.Struct('!B')
+U16 = struct.Struct('!H')
+U32 = struct.Struct('!I')
+LOBBY_PLAYER = struct.Struct('!IBH')
+PLAYER_LEFT = struct.Struct('!II')
+READY_CHANGED = struct.Struct('!IIB')
+SEQ_BOARD = struct.Struct(f'!I{BOARD_BYTES}sB')
+DELTA_ROW = struct.Struct('!BH')
+INPUTS = struct.Struct('!IBB')
+INPUT = struct.Struct('!BB')
+PIECE_STATE = struct.Struct('!IBbb')
+RANK = struct.Struct('!III')
+
+
+def pack_board(rows):
+    bits = 0
+    for y, row in enumerate(rows):
+        bits |= row << (y * COLUMNS)
+    return bits.to_bytes(BOARD_BYTES, 'big')
+
+
+def unpack_board(data):
+    bits = int.from_bytes(data, 'big')
+    mask = (1 << COLUMNS) - 1
+    return [(bits >> (y * COLUMNS)) & mask for y in range(ROWS)]
+
+
+def pack_piece(piece):
+    if not piece:
+        return NO_PIECE
+    return piece['kind'] << 2 | piece['rot']
+
+
+def unpack_piece(value):
+    if value == NO_PIECE:
+        return None
+    return {'kind': value >> 2, 'rot': value & 3}
+
+
+def pack_empty(msg):
+    return b''
+
+
+def unpack_empty(data):
+    return {}
+
+
+def pack_ready(msg):
+    return U8.pack(bool(msg['ready']))
+
+
+def unpack_ready(data):
+    return {'ready': bool(data[0])}
+
+
+def pack_value(msg):
+    return U32.pack(msg['value'])
+
+
+def unpack_value(data):
+    return {'value': U32.unpack(data)[0]}
+
+
+def pack_text(text):
+    data = text.encode()
+    return U16.pack(len(data)) + data
+
+
+def unpack_text(data, offset):
+    length, = U16.unpack_from(data, offset)
+    offset += U16.size
+    return data[offset:offset + length].decode(), offset + length
+
+
+def pack_player(player):
+    name = player['name'].encode()
+    return LOBBY_PLAYER.pack(player['id'], bool(player['ready']), len(name)) + name
+
+
+def unpack_player(data, offset):
+    player_id, ready, length = LOBBY_PLAYER.unpack_from(data, offset)
+    offset += LOBBY_PLAYER.size
+    player = {'id': player_id, 'name': data[offset:offset + length].decode(), 'ready': bool(ready)}
+    return player, offset + length
+
+
+def pack_lobby(msg):
+    parts = [pack_text(msg.get('room', '')), U32.pack(msg['version']), U16.pack(len(msg['players']))]
+    parts.extend(pack_player(player) for player in msg['players'])
+    return b''.join(parts)
+
+
+def unpack_lobby(data):
+    room, offset = unpack_text(data, 0)
+    version, = U32.unpack_from(data, offset)
+    count, = U16.unpack_from(data, offset + U32.size)
+    offset += U32.size + U16.size
+    players = []
+    for _ in range(count):
+        player, offset = unpack_player(data, offset)
+        players.append(player)
+    return {'room': room, 'version': version, 'players': players}
+
+
+def pack_player_joined(msg):
+    return U32.pack(msg['version']) + pack_player(msg['player'])
+
+
+def unpack_player_joined(data):
+    version, = U32.unpack_from(data)
+    player, offset = unpack_player(data, U32.size)
+    return {'version': version, 'player': player}
+
+
+def pack_player_left(msg):
+    return PLAYER_LEFT.pack(msg['version'], msg['id'])
+
+
+def unpack_player_left(data):
+    version, player_id = PLAYER_LEFT.unpack(data)
+    return {'version': version, 'id': player_id}
+
+
+def pack_ready_changed(msg):
+    return READY_CHANGED.pack(msg['version'], msg['id'], bool(msg['ready']))
+
+
+def unpack_ready_changed(data):
+    version, player_id, ready = READY_CHANGED.unpack(data)
+    return {'version': version, 'id': player_id, 'ready': bool(ready)}
+
+
+def pack_board_msg(msg):
+    return SEQ_BOARD.pack(msg['seq'], pack_board(msg['board']), pack_piece(msg.get('piece')))
+
+
+def unpack_board_msg(data):
+    seq, board, piece = SEQ_BOARD.unpack(data)
+    return {'seq': seq, 'board': unpack_board(board), 'piece': unpack_piece(piece)}
+
+
+def pack_board_delta(msg):
+    return U32.pack(msg['seq']) + b''.join(DELTA_ROW.pack(y, row) for y, row in msg['rows'])
+
+
+def unpack_board_delta(data):
+    seq, = U32.unpack_from(data)
+    rows = [list(DELTA_ROW.unpack_from(data, offset)) for offset in range(U32.size, len(data), DELTA_ROW.size)]
+    return {'seq': seq, 'rows': rows}
+
+
+def pack_piece_msg(msg):
+    return U8.pack(pack_piece(msg['piece']))
+
+
+def unpack_piece_msg(data):
+    return {'piece': unpack_piece(data[0])}
+
+
+def pack_piece_state(msg):
+    return PIECE_STATE.pack(msg['tick'], pack_piece(msg), msg['x'], msg['y'])
+
+
+def unpack_piece_state(data):
+    tick, piece, x, y = PIECE_STATE.unpack(data)
+    return dict(unpack_piece(piece), tick=tick, x=x, y=y)
+
+
+def pack_inputs(msg):
+    # Action ticks are sent as offsets back from the message tick, which the
+    # sender keeps within one gravity period
+    has_hash = 'hash' in msg
+    parts = [INPUTS.pack(msg['tick'], has_hash, len(msg['actions']))]
+    if has_hash:
+        parts.append(U32.pack(msg['hash']))
+    parts.extend(INPUT.pack(msg['tick'] - tick, action) for tick, action in msg['actions'])
+    return b''.join(parts)
+
+
+def unpack_inputs(data):
+    tick, has_hash, count = INPUTS.unpack_from(data)
+    offset = INPUTS.size
+    msg = {'tick': tick}
+    if has_hash:
+        msg['hash'], = U32.unpack_from(data, offset)
+        offset += U32.size
+    msg['actions'] = [[tick - back, action] for back, action in
+                      (INPUT.unpack_from(data, offset + i * INPUT.size) for i in range(count))]
+    return msg
+
+
+def pack_leaderboard(msg):
+    parts = [U32.pack(msg['total']), U16.pack(len(msg['entries']))]
+    parts.extend(U32.pack(entry['score']) + pack_text(entry['name']) for entry in msg['entries'])
+    return b''.join(parts)
+
+
+def unpack_leaderboard(data):
+    total, = U32.unpack_from(data)
+    count, = U16.unpack_from(data, U32.size)
+    offset = U32.size + U16.size
+    entries = []
+    for _ in range(count):
+        score, = U32.unpack_from(data, offset)
+        name, offset = unpack_text(data, offset + U32.size)
+        entries.append({'name': name, 'score': score})
+    return {'total': total, 'entries': entries}
+
+
+def pack_rank(msg):
+    # Rank 0 is a player with no score yet
+    return RANK.pack(msg['rank'], msg['score'], msg['total']) + pack_text(msg['name'])
+
+
+def unpack_rank(data):
+    rank, score, total = RANK.unpack_from(data)
+    name, offset = unpack_text(data, RANK.size)
+    return {'name': name, 'rank': rank, 'score': score, 'total': total}
+
+
+# type name -> (type id, pack, unpack); anything else is always sent as JSON
+CODECS = {
+    'ready': (1, pack_ready, unpack_ready),
+    'lobby': (2, pack_lobby, unpack_lobby),
+    'score': (3, pack_value, unpack_value),
+    'countdown': (4, pack_value, unpack_value),
+    'board': (5, pack_board_msg, unpack_board_msg),
+    'board_delta': (6, pack_board_delta, unpack_board_delta),
+    'resync': (7, pack_empty, unpack_empty),
+    'next_piece': (8, pack_piece_msg, unpack_piece_msg),
+    'hold_piece': (9, pack_piece_msg, unpack_piece_msg),
+    'inputs': (10, pack_inputs, unpack_inputs),
+    'player_joined': (11, pack_player_joined, unpack_player_joined),
+    'player_left': (12, pack_player_left, unpack_player_left),
+    'ready_changed': (13, pack_ready_changed, unpack_ready_changed),
+    'piece_state': (14, pack_piece_state, unpack_piece_state),
+    'leaderboard': (15, pack_leaderboard, unpack_leaderboard),
+    'rank': (16, pack_rank, unpack_rank),
+}
+DECODERS = {type_id: (name, unpack) for name, (type_id, pack, unpack) in CODECS.items()}
+
+
+def encode_payload(msg, binary=False):
+    codec = CODECS.get(msg['type']) if binary else None
+    if codec is None:
+        return json.dumps(msg).encode()
+    type_id, pack, unpack = codec
+    return U8.pack(type_id) + pack(msg)
+
+
+def decode_payload(payload):
+    if payload[0] == JSON_MARK:
+        return json.loads(payload)
+    name, unpack = DECODERS[payload[0]]
+    msg = unpack(payload[1:])
+    msg['type'] = name
+    return msg
+
+
+def encode(msg, binary=False):
+    payload = encode_payload(msg, binary)
+    return HEADER.pack(len(payload)) + payload
+
+
+def is_binary_frame(frame):
+    return frame[HEADER.size] != JSON_MARK
+
+
+class FrameDecoder:
+    # Buffers partial reads; feed() returns every complete message received so far
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        return self.feed_frames(data, False)
+
+    def feed_frames(self, data, keep_frames=True):
+        # With keep_frames, returns (message, frame) pairs so a relay can
+        # forward the frame bytes as received instead of encoding again
+        self.buffer += data
+        messages = []
+        offset = 0
+        buffer = self.buffer
+        while len(buffer) - offset >= HEADER.size:
+            length, = HEADER.unpack_from(buffer, offset)
+            if length > MAX_FRAME:
+                raise ValueError(f"Frame of {length} bytes exceeds MAX_FRAME")
+            end = offset + HEADER.size + length
+            if len(buffer) < end:
+                break
+            msg = decode_payload(bytes(buffer[offset + HEADER.size:end]))
+            messages.append((msg, bytes(buffer[offset:end])) if keep_frames else msg)
+            offset = end
+        if offset:
+            del buffer[:offset]
+        return messages
@@ -0,0 +1,79 @@
+from engine import PIECE_STATES
+
+
+class BoardRenderer:
+    # Creates one rectangle per cell up front and afterwards only flips the
+    # visibility of cells whose bit changed since the previous frame
+    def __init__(self, canvas, columns, rows, tile_size, color, outline="gray"):
+        self.canvas = canvas
+        self.columns = columns
+        self.items = []
+        for y in range(rows):
+            self.items.append([
+                canvas.create_rectangle(
+                    x * tile_size, y * tile_size,
+                    (x + 1) * tile_size, (y + 1) * tile_size,
+                    fill=color, outline=outline, state="hidden"
+                )
+                for x in range(columns)
+            ])
+        self.rows = [0] * rows
+        self.touched = 0
+        self.total_touched = 0
+        self.frames = 0
+
+    def render(self, rows):
+        touched = 0
+        itemconfig = self.canvas.itemconfig
+        for y, row in enumerate(rows):
+            changed = row ^ self.rows[y]
+            if not changed:
+                continue
+            items = self.items[y]
+            for x in range(self.columns):
+                if changed >> x & 1:
+                    itemconfig(items[x], state="normal" if row >> x & 1 else "hidden")
+                    touched += 1
+            self.rows[y] = row
+        self.touched = touched
+        self.total_touched += touched
+        self.frames += 1
+        return touched
+
+
+class PieceRenderer:
+    # Preview box for next/hold: four rectangles moved into place when the piece changes
+    def __init__(self, canvas, size, tile_size, color, outline="black"):
+        self.canvas = canvas
+        self.size = size
+        self.tile_size = tile_size
+        self.items = [
+            canvas.create_rectangle(0, 0, tile_size, tile_size, fill=color, outline=outline, state="hidden")
+            for _ in range(4)
+        ]
+        self.piece = None
+        self.touched = 0
+
+    def render(self, piece):
+        key = (piece['kind'], piece['rot']) if piece else None
+        if key == self.piece:
+            self.touched = 0
+            return 0
+        self.piece = key
+        if key is None:
+            for item in self.items:
+                self.canvas.itemconfig(item, state="hidden")
+        else:
+            state = PIECE_STATES[key[0]][key[1]]
+            tile_size = self.tile_size
+            offset_x = (self.size - state['width'] * tile_size) // 2
+            offset_y = (self.size - state['height'] * tile_size) // 2
+            for item, (x, y) in zip(self.items, state['cells']):
+                self.canvas.coords(
+                    item,
+                    offset_x + x * tile_size, offset_y + y * tile_size,
+                    offset_x + (x + 1) * tile_size, offset_y + (y + 1) * tile_size
+                )
+                self.canvas.itemconfig(item, state="normal")
+        self.touched = len(self.items)
+        return self.touched
@@ -0,0 +1,58 @@
+DEFAULT_ROOM = 'main'
+
+# Keeps room list updates between worker processes small
+MAX_ROOM_NAME = 64
+
+
+class RoomSystem:
+    # Named public/private rooms, after LobbySystem in the trial lobby app.
+    # Players are stored per room by id() so membership and fan-out are O(1).
+    def __init__(self):
+        self.rooms = {}  # room name -> {public, password, players}
+        self.create_room(DEFAULT_ROOM, True, "")
+
+    def create_room(self, name, public, password):
+        if name in self.rooms:
+            return False, "Room name already taken"
+        if len(name) > MAX_ROOM_NAME:
+            return False, "Room name too long"
+        self.rooms[name] = {
+            'name': name,
+            'public': public,
+            'password': password,
+            'players': {},
+            'version': 0  # bumped by every lobby event, so clients can spot gaps
+        }
+        return True, "Room created"
+
+    def get_room_list(self):
+        return [
+            {'name': name, 'players': len(room['players'])}
+            for name, room in self.rooms.items() if room['public']
+        ]
+
+    def join_room(self, name, client, password=""):
+        # Joining a room that doesn't exist creates it, private if a password is given
+        if name not in self.rooms:
+            ok, message = self.create_room(name, not password, password)
+            if not ok:
+                return ok, message
+        room = self.rooms[name]
+        if not room['public'] and room['password'] != password:
+            return False, "Incorrect password"
+        if client.get('room') is room:
+            return True, "Already in room"
+        self.leave_room(client)
+        room['players'][id(client)] = client
+        client['room'] = room
+        return True, "Joined room"
+
+    def leave_room(self, client):
+        room = client.get('room')
+        if room is None:
+            return None
+        room['players'].pop(id(client), None)
+        client['room'] = None
+        if not room['players'] and room['name'] != DEFAULT_ROOM:
+            del self.rooms[room['name']]
+        return room
@@ -0,0 +1,122 @@
+import random
+
+from engine import Engine, COLUMNS
+
+# One logical tick is TICK_MS of wall clock when a Tk client drives the game
+TICK_MS = 50
+GRAVITY_TICKS = 10
+
+ACTIONS = ('left', 'right', 'down', 'rotate', 'rotate_back', 'drop', 'hold')
+
+
+class Game:
+    def __init__(self, seed=None, gravity_ticks=GRAVITY_TICKS):
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.engine = Engine(self.rng)
+        self.gravity_ticks = gravity_ticks
+        self.tick = 0
+        self.current_piece = self.new_piece()
+        self.next_piece = self.new_piece()
+        self.hold_piece = None
+        self.can_hold = True
+        self.running = True
+        self.pieces = 0
+        self.inputs = []  # (tick, action) log, enough to replay the game with the seed
+
+    @property
+    def board(self):
+        return self.engine.board
+
+    @property
+    def score(self):
+        return self.engine.score
+
+    def new_piece(self):
+        return self.engine.new_piece()
+
+    def shape(self, piece):
+        return self.engine.shape(piece)
+
+    def board_with_piece(self):
+        return self.engine.board_with_piece(self.current_piece)
+
+    def apply(self, action):
+        if not self.running:
+            return False
+        self.inputs.append((self.tick, action))
+        engine = self.engine
+        piece = self.current_piece
+        if action == 'left':
+            return engine.move(piece, -1, 0)
+        if action == 'right':
+            return engine.move(piece, 1, 0)
+        if action == 'down':
+            return engine.move(piece, 0, 1)
+        if action == 'rotate':
+            return engine.rotate(piece, 1)
+        if action == 'rotate_back':
+            return engine.rotate(piece, -1)
+        if action == 'drop':
+            y = piece['y']
+            engine.drop(piece)
+            return piece['y'] != y
+        if action == 'hold':
+            return self.hold()
+        raise ValueError(f"Unknown action: {action}")
+
+    def hold(self):
+        if not self.can_hold:
+            return False
+        self.can_hold = False
+        if self.hold_piece is None:
+            self.hold_piece = self.current_piece
+            self.current_piece = self.next_piece
+            self.next_piece = self.new_piece()
+        else:
+            self.hold_piece, self.current_piece = self.current_piece, self.hold_piece
+            self.current_piece['x'] = COLUMNS // 2 - len(self.shape(self.current_piece)[0]) // 2
+            self.current_piece['y'] = 0
+        return True
+
+    def step(self):
+        # Advance one logical tick; returns the events it produced
+        if not self.running:
+            return []
+        self.tick += 1
+        if self.tick % self.gravity_ticks:
+            return []
+        if self.engine.move(self.current_piece, 0, 1):
+            return [('fall',)]
+        return self.freeze()
+
+    def freeze(self):
+        lines = self.engine.lock(self.current_piece)
+        self.pieces += 1
+        self.current_piece = self.next_piece
+        self.next_piece = self.new_piece()
+        self.can_hold = True
+        events = [('lock', lines)]
+        if self.engine.collision(self.current_piece):
+            self.running = False
+            events.append(('game_over',))
+        return events
+
+
+def run_headless(seed, script=(), max_ticks=None, gravity_ticks=GRAVITY_TICKS):
+    # Plays a game as fast as the CPU allows; script is an iterable of (tick, action)
+    game = Game(seed, gravity_ticks)
+    pending = sorted(script, key=lambda item: item[0])
+    i = 0
+    while game.running and (max_ticks is None or game.tick < max_ticks):
+        while i < len(pending) and pending[i][0] <= game.tick:
+            game.apply(pending[i][1])
+            i += 1
+        game.step()
+    return game
+
+
+def replay(game, max_ticks=None):
+    return run_headless(game.seed, game.inputs, max_ticks, game.gravity_ticks)
@@ -1,83 +1,622 @@
-import socket
-import threading
+import asyncio
+import itertools
 import json
+import multiprocessing
+import random
+import secrets
+import socket
+import sys
+import zlib
+from protocol import encode, FrameDecoder, HEADER, MAX_FRAME, decode_payload, is_binary_frame
+from outbox import Outbox, OUTBOX_LIMIT, COALESCE
+from rooms import RoomSystem, DEFAULT_ROOM
+from matchmaking import MatchQueue, DEFAULT_RATING, parse_rating
+from authority import AuthoritativeMatch, TickScheduler
+from leaderboard import Leaderboard
 
 HOST = '127.0.0.1'
 PORT = 5555
+BACKLOG = 1024
 
-clients = []
-ready_status = {}
-lock = threading.Lock()
+# Per-connection outbound queue size and what happens when a client can't keep up
+OVERFLOW_POLICY = COALESCE
 
-def broadcast(message, sender_conn=None):
-    with lock:
-        for client in clients:
-            conn = client['conn']
-            if conn != sender_conn:
-                try:
-                    conn.send(json.dumps(message).encode())
-                except:
-                    pass
+# Worker processes; more than one needs socket.send_fds (not available on Windows)
+WORKERS = 1
+CONTROL_BUFSIZE = 1 << 16
 
-def handle_client(conn, addr):
-    global clients, ready_status
-    try:
-        username = conn.recv(1024).decode()
-        with lock:
-            clients.append({'conn': conn, 'addr': addr, 'username': username})
-            ready_status[username] = False
-        update_lobby()
+# Room list changes per control message, keeping each one well under CONTROL_BUFSIZE
+ROOMS_PER_UPDATE = 256
+
+# Seconds between passes over the match queue as search windows widen
+MATCH_INTERVAL = 0.5
+
+# Simulate matched games on the server from player inputs instead of
+# relaying the boards and scores clients report
+AUTHORITATIVE = False
+
+# Otherwise matched clients can exchange only their inputs and simulate each
+# other from the shared seed, rather than streaming boards
+LOCKSTEP = False
+
+# Entries in a leaderboard reply when the client doesn't ask, and the most it may ask for
+LEADERBOARD_SIZE = 10
+MAX_LEADERBOARD = 100
+
+# Scores travel as unsigned 32-bit values in the binary codec
+MAX_SCORE = 2 ** 32 - 1
+
+# Joined connections, keyed by id(); only touched from the event loop, so no lock
+clients = {}
+room_system = RoomSystem()
+match_queue = MatchQueue()
+match_ids = itertools.count(1)
+player_ids = itertools.count(1)
+scheduler = TickScheduler()
+
+# Best score per username. In sharded mode it lives in the front process and
+# workers forward scores and queries to it. Replies are kept encoded until a
+# score changes; rank misses aren't cached, so made-up names can't grow it.
+leaderboard = Leaderboard()
+leaderboard_cache = {}
+leaderboard_requests = {}  # worker side: request id -> client awaiting the reply
+request_ids = itertools.count()
 
+# Set in worker processes: which worker this is, the control socket to the
+# front process, and the merged public room list of every worker
+worker_index = 0
+worker_count = 1
+control = None
+stopped = None
+room_directory = None  # room name -> players
+dirty_rooms = set()
+control_locks = {}
+
+def send(client, frame, key=None, supersedes=False):
+    if not client['outbox'].put(frame, key, supersedes):
+        # Slow consumer under the disconnect policy; the reader loop cleans up
+        client['writer'].transport.abort()
+
+def broadcast(message, room, sender=None, key=None, supersedes=False, frame=None):
+    # Fan-out is scoped to one room, so traffic per game doesn't grow with the
+    # server. The message is encoded at most once per codec and the same bytes
+    # go into every recipient's outbox; a binary frame relayed from the sender
+    # is forwarded as received, so it isn't encoded at all.
+    frames = {True: frame} if frame is not None and is_binary_frame(frame) else {}
+    for client in room['players'].values():
+        if client is sender:
+            continue
+        binary = client['binary']
+        if binary not in frames:
+            frames[binary] = encode(message, binary)
+        send(client, frames[binary], key, supersedes)
+
+async def client_writer(client):
+    writer = client['writer']
+    outbox = client['outbox']
+    while True:
+        # Everything pending goes out in one write. Python 3.12+ gathers the
+        # frames with sendmsg; on 3.9 (requirements.txt) writelines joins them
+        # into one copy first, so scatter-gather only pays off from 3.12 on.
+        writer.writelines(await outbox.get_all())
+        await writer.drain()
+
+def server_stats():
+    totals = {'depth': 0, 'high_water': 0, 'sent': 0, 'dropped': 0, 'coalesced': 0}
+    for client in clients.values():
+        for name, value in client['outbox'].stats().items():
+            totals[name] = max(totals[name], value) if name == 'high_water' else totals[name] + value
+    return {'clients': len(clients), 'rooms': len(room_system.rooms), 'policy': OVERFLOW_POLICY, 'outbox_limit': OUTBOX_LIMIT, 'totals': totals,
+            'authority': scheduler.stats(), 'leaderboard': len(leaderboard)}
+
+async def handle_client(reader, writer, initial=b''):
+    addr = writer.get_extra_info('peername')
+    client = {'writer': writer, 'addr': addr, 'username': None, 'binary': False,
+              'ready': False, 'room': None, 'match': None, 'outbox': Outbox(OUTBOX_LIMIT, OVERFLOW_POLICY)}
+    writer_task = asyncio.create_task(client_writer(client))
+    decoder = FrameDecoder()
+    try:
+        # Bytes the front process read before handing the connection over
+        for msg, frame in decoder.feed_frames(initial):
+            handle_message(client, msg, frame)
         while True:
-            data = conn.recv(2048)
+            data = await reader.read(4096)
             if not data:
                 break
-            msg = json.loads(data.decode())
+            for msg, frame in decoder.feed_frames(data):
+                handle_message(client, msg, frame)
+            # read() doesn't suspend while data is buffered; let the writers drain
+            await asyncio.sleep(0)
+
+    except Exception as e:
+        print(f"Error handling client {addr}: {e}")
+    finally:
+        writer_task.cancel()
+        writer.close()
+        if clients.pop(id(client), None):
+            match_queue.remove(client)
+            leave_match(client)
+            room = room_system.leave_room(client)
+            if room is not None:
+                announce_leave(room, client)
+                publish_rooms(room['name'])
+
+def handle_message(client, msg, frame=None):
+    if msg['type'] == 'join' and client['username'] is None:
+        client['binary'] = msg.get('codec') == 'binary'
+        client['rating'] = parse_rating(msg.get('rating', DEFAULT_RATING))
+        if enter_room(client, msg.get('room') or DEFAULT_ROOM, msg.get('password', "")):
+            client['username'] = msg['username']
+            client['pid'] = next(player_ids)
+            clients[id(client)] = client
+            announce_join(client)
+
+    elif msg['type'] == 'lobby_resync' and client['room'] is not None:
+        send_lobby(client)
+
+    elif msg['type'] == 'rooms':
+        if room_directory is not None:
+            rooms = [{'name': name, 'players': players} for name, players in room_directory.items()]
+        else:
+            rooms = room_system.get_room_list()
+        send(client, encode({'type': 'rooms', 'rooms': rooms}, client['binary']))
+
+    elif client['username'] is None:
+        raise ValueError(f"Expected join, got {msg['type']}")
+
+    elif msg['type'] == 'join_room':
+        old_room = client['room']
+        if room_worker(msg['room'], worker_count) != worker_index:
+            # The room lives in another worker process; only the front can move the socket there
+            send(client, encode({'type': 'error', 'message': "Room is on another server, reconnect to join it"},
+                                client['binary']))
+        elif enter_room(client, msg['room'], msg.get('password', "")) and client['room'] is not old_room:
+            client['ready'] = False
+            match_queue.remove(client)
+            leave_match(client)
+            announce_leave(old_room, client)
+            announce_join(client)
+
+    elif msg['type'] == 'ready':
+        client['ready'] = msg['ready']
+        lobby_event(client['room'], {'type': 'ready_changed', 'id': client['pid'], 'ready': client['ready']})
+        if client['room']['name'] == DEFAULT_ROOM:
+            queue_for_match(client)
+
+    elif msg['type'] == 'input':
+        if client['match'] is not None:
+            client['match'].queue_input(client, msg['action'])
+
+    elif msg['type'] in ('score', 'board', 'board_delta', 'piece_state', 'inputs') and client['match'] is not None:
+        # Authoritative matches only publish what the server simulated
+        pass
+
+    elif msg['type'] == 'score':
+        if not isinstance(msg['value'], int) or not 0 <= msg['value'] <= MAX_SCORE:
+            return
+        submit_score(client, msg['value'])
+        broadcast({'type': 'score', 'value': msg['value']}, client['room'], sender=client,
+                  key=('score', id(client)), supersedes=True, frame=frame)
+
+    elif msg['type'] == 'board':
+        # A keyframe makes any queued board/delta from the same player obsolete
+        broadcast({
+            'type': 'board',
+            'seq': msg['seq'],
+            'board': msg['board'],
+            'piece': msg.get('piece')
+        }, client['room'], sender=client, key=('board', id(client)), supersedes=True, frame=frame)
+
+    elif msg['type'] == 'board_delta':
+        broadcast({'type': 'board_delta', 'seq': msg['seq'], 'rows': msg['rows']}, client['room'], sender=client,
+                  key=('board', id(client)), frame=frame)
+
+    elif msg['type'] == 'piece_state':
+        broadcast(msg, client['room'], sender=client, key=('piece', id(client)), supersedes=True, frame=frame)
+
+    elif msg['type'] == 'inputs':
+        # Lockstep inputs can't be coalesced; a lost one shows up as a hash mismatch
+        broadcast(msg, client['room'], sender=client, frame=frame)
+
+    elif msg['type'] == 'resync':
+        broadcast({'type': 'resync'}, client['room'], sender=client)
+
+    elif msg['type'] in ('get_leaderboard', 'get_rank'):
+        query = leaderboard_query(client, msg)
+        if control is not None:
+            request = next(request_ids)
+            leaderboard_requests[request] = client
+            post_control(control, json.dumps({'type': 'leaderboard_query', 'request': request,
+                                              'query': query}).encode())
+        else:
+            send(client, leaderboard_frame(query, client['binary']))
+
+    elif msg['type'] == 'stats':
+        stats = server_stats()
+        stats['outbox'] = client['outbox'].stats()
+        send(client, encode(dict(stats, type='stats')))
+
+def enter_room(client, name, password):
+    old_room = client['room']
+    ok, message = room_system.join_room(name, client, password)
+    if not ok:
+        send(client, encode({'type': 'error', 'message': message}, client['binary']))
+    else:
+        publish_rooms(name, *([old_room['name']] if old_room else []))
+    return ok
+
+def queue_for_match(client):
+    # Ready players in the default room wait for an opponent of similar rating
+    if not client['ready']:
+        match_queue.remove(client)
+        return
+    match_queue.add(client, client['rating'])
+    opponent = match_queue.find_match(client)
+    if opponent is not None:
+        start_match(opponent, client)
+
+def start_match(first, second):
+    # Each pair gets its own private room, so their traffic stays between them
+    name = f"match-{next(match_ids)}"
+    while room_worker(name, worker_count) != worker_index:
+        # Only names this worker owns, so a join through the front finds the room here
+        name = f"match-{next(match_ids)}"
+    password = secrets.token_hex(8)
+    room_system.create_room(name, False, password)
+    seed = random.randrange(2 ** 32)
+    match = AuthoritativeMatch([first, second], seed) if AUTHORITATIVE else None
+    for client, opponent in ((first, second), (second, first)):
+        old_room = client['room']
+        room_system.join_room(name, client, password)
+        client['ready'] = False
+        client['match'] = match
+        announce_leave(old_room, client)
+        publish_rooms(old_room['name'])
+        send(client, encode({'type': 'start', 'room': name, 'opponent': opponent['username'], 'seed': seed,
+                             'authoritative': match is not None, 'lockstep': LOCKSTEP and match is None},
+                            client['binary']))
+    if match is not None:
+        scheduler.add(match)
 
-            if msg['type'] == 'ready':
-                with lock:
-                    ready_status[username] = msg['ready']
-                update_lobby()
+def step_match(match):
+    # Called by the scheduler once per tick for every authoritative match
+    for client, state, board, score in match.step():
+        send(client, encode(state, client['binary']), key='state', supersedes=True)
+        if board is not None:
+            broadcast(board, client['room'], sender=client, key=('board', id(client)),
+                      supersedes=board['type'] == 'board')
+        if score is not None:
+            submit_score(client, score)
+            broadcast({'type': 'score', 'value': score}, client['room'], sender=client,
+                      key=('score', id(client)), supersedes=True)
+    if not match.running:
+        scheduler.remove(match)
 
-            elif msg['type'] == 'score':
-                broadcast({'type': 'score', 'value': msg['value']}, sender_conn=conn)
+def leave_match(client):
+    match = client['match']
+    if match is None:
+        return
+    client['match'] = None
+    match.leave(client)
+    if not match.players:
+        scheduler.remove(match)
 
-            elif msg['type'] == 'board':
+def submit_score(client, score):
+    if client['username'] is None:
+        return
+    if control is not None:
+        # Only improvements go to the front, which owns the leaderboard
+        if score > client.get('best', -1):
+            client['best'] = score
+            post_control(control, json.dumps({'type': 'score', 'name': client['username'],
+                                              'score': score}).encode())
+    elif leaderboard.submit(client['username'], score):
+        leaderboard_cache.clear()
 
-                broadcast({
-                    'type': 'board',
-                    'board': msg['board'],
-                    'piece': msg['piece']
-                }, sender_conn=conn)
+def leaderboard_query(client, msg):
+    if msg['type'] == 'get_leaderboard':
+        return {'type': 'get_leaderboard',
+                'limit': max(1, min(int(msg.get('limit', LEADERBOARD_SIZE)), MAX_LEADERBOARD))}
+    return {'type': 'get_rank', 'name': msg.get('name') or client['username']}
 
+def leaderboard_key(query):
+    # None for a rank query about a name with no score
+    if query['type'] == 'get_leaderboard':
+        return 'top', query['limit']
+    return ('rank', query['name']) if query['name'] in leaderboard.scores else None
+
+def leaderboard_message(query):
+    if query['type'] == 'get_leaderboard':
+        entries = [{'name': name, 'score': score} for name, score in leaderboard.top(query['limit'])]
+        return {'type': 'leaderboard', 'total': len(leaderboard), 'entries': entries}
+    name = query['name']
+    return {'type': 'rank', 'name': name, 'rank': leaderboard.rank(name) or 0,
+            'score': leaderboard.scores.get(name, 0), 'total': len(leaderboard)}
+
+def leaderboard_frame(query, binary):
+    key = leaderboard_key(query)
+    frame = leaderboard_cache.get((key, binary))
+    if frame is None:
+        frame = encode(leaderboard_message(query), binary)
+        if key is not None:
+            leaderboard_cache[(key, binary)] = frame
+    return frame
+
+async def matchmaker():
+    # Search windows widen while players wait, so the queue is re-checked
+    while True:
+        await asyncio.sleep(MATCH_INTERVAL)
+        for first, second in match_queue.match_all():
+            start_match(first, second)
+
+# Lobby changes go out as numbered events sized by the change, not the room;
+# a full snapshot is only sent to a player who joins or asks to resync
+
+def lobby_player(client):
+    return {'id': client['pid'], 'name': client['username'], 'ready': client['ready']}
+
+def lobby_event(room, message, sender=None):
+    # A dropped event shows up as a version gap and the client resyncs
+    room['version'] += 1
+    message['version'] = room['version']
+    broadcast(message, room, sender=sender, key='lobby')
+
+def send_lobby(client):
+    room = client['room']
+    players = [lobby_player(c) for c in room['players'].values()]
+    send(client, encode({'type': 'lobby', 'room': room['name'], 'version': room['version'], 'players': players},
+                        client['binary']), key='lobby', supersedes=True)
+
+def announce_join(client):
+    lobby_event(client['room'], {'type': 'player_joined', 'player': lobby_player(client)}, sender=client)
+    send_lobby(client)
+
+def announce_leave(room, client):
+    lobby_event(room, {'type': 'player_left', 'id': client['pid']})
+
+async def serve():
+    server = await asyncio.start_server(handle_client, HOST, PORT, backlog=BACKLOG)
+    print(f"Server listening on {HOST}:{PORT}")
+    matcher = asyncio.create_task(matchmaker())
+    ticker = asyncio.create_task(scheduler.run(step_match))
+    async with server:
+        await server.serve_forever()
+
+# Sharded mode: a front process accepts connections, reads the first join to
+# learn the room, and passes the socket to the worker that owns that room.
+# A room lives entirely in one worker, so its lobby and ready state never
+# need cross-process coordination; only the public room list is merged, and
+# only changed rooms are sent. A player can't join_room into a room another
+# worker owns, they reconnect through the front instead.
+
+def room_worker(room, workers):
+    return zlib.crc32(room.encode()) % workers
+
+async def send_control(ctrl, data, fds=()):
+    # Control sockets are non-blocking, and a burst of joins can fill one;
+    # wait until it drains rather than fail. The lock keeps messages in order
+    # and leaves one writer callback per socket.
+    loop = asyncio.get_running_loop()
+    lock = control_locks.setdefault(ctrl.fileno(), asyncio.Lock())
+    async with lock:
+        while True:
+            try:
+                socket.send_fds(ctrl, [data], list(fds))
+                return
+            except BlockingIOError:
+                writable = loop.create_future()
+                loop.add_writer(ctrl.fileno(), lambda: writable.done() or writable.set_result(None))
+                try:
+                    await writable
+                finally:
+                    loop.remove_writer(ctrl.fileno())
+
+def post_control(ctrl, data):
+    # For updates nobody waits on; a peer that went away is noticed by the
+    # EOF on its control socket, so a failed send there isn't an error
+    asyncio.create_task(send_control(ctrl, data)).add_done_callback(control_sent)
+
+def control_sent(task):
+    error = None if task.cancelled() else task.exception()
+    if error is not None and not isinstance(error, ConnectionError):
+        print(f"Error sending control message: {error}")
+
+def recv_control(ctrl):
+    # Returns (message, fds); an oversized message is dropped rather than
+    # parsed truncated. None means the other end has closed.
+    try:
+        data, fds, flags, addr = socket.recv_fds(ctrl, CONTROL_BUFSIZE, 1)
+    except ConnectionError:
+        return None, []
+    if flags & socket.MSG_TRUNC:
+        for fd in fds:
+            socket.socket(fileno=fd).close()
+        print(f"Dropped control message over {CONTROL_BUFSIZE} bytes")
+        return b'', []
+    if not data:
+        return None, fds
+    return data, fds
+
+def room_updates(rooms):
+    # {name: players, or None once it is gone or private}, split into
+    # messages of at most ROOMS_PER_UPDATE rooms
+    names = list(rooms)
+    for start in range(0, len(names), ROOMS_PER_UPDATE):
+        chunk = {name: rooms[name] for name in names[start:start + ROOMS_PER_UPDATE]}
+        yield json.dumps({'type': 'rooms_changed', 'rooms': chunk}).encode()
+
+def publish_rooms(*names):
+    if control is None or stopped.is_set():
+        return
+    if not dirty_rooms:
+        asyncio.get_running_loop().call_soon(send_room_changes)
+    dirty_rooms.update(names)
+
+def send_room_changes():
+    changed = {}
+    for name in dirty_rooms:
+        room = room_system.rooms.get(name)
+        changed[name] = len(room['players']) if room is not None and room['public'] else None
+    dirty_rooms.clear()
+    for data in room_updates(changed):
+        post_control(control, data)
+
+def on_control_message():
+    data, fds = recv_control(control)
+    if fds:
+        conn = socket.socket(fileno=fds[0])
+        asyncio.create_task(adopt_client(conn, data))
+    elif data is None:
+        # The front process is gone; nothing new can reach this worker
+        stopped.set()
+    elif data:
+        msg = json.loads(data)
+        if msg['type'] == 'rooms_changed':
+            for name, players in msg['rooms'].items():
+                if players is None:
+                    room_directory.pop(name, None)
+                else:
+                    room_directory[name] = players
+        elif msg['type'] == 'leaderboard_reply':
+            client = leaderboard_requests.pop(msg['request'], None)
+            if client is not None and id(client) in clients:
+                send(client, encode(msg['message'], client['binary']))
+
+async def adopt_client(conn, initial):
+    reader, writer = await asyncio.open_connection(sock=conn)
+    await handle_client(reader, writer, initial)
+
+async def worker_main(ctrl, index, workers):
+    global control, stopped, worker_index, worker_count, player_ids, room_directory
+    control = ctrl
+    stopped = asyncio.Event()
+    worker_index = index
+    worker_count = workers
+    # Player ids interleave across workers, so they stay unique server-wide
+    player_ids = itertools.count(index + 1, workers)
+    room_directory = {}
+    control.setblocking(False)
+    asyncio.get_running_loop().add_reader(control.fileno(), on_control_message)
+    publish_rooms(*room_system.rooms)
+    matcher = asyncio.create_task(matchmaker())
+    ticker = asyncio.create_task(scheduler.run(step_match))
+    await stopped.wait()
+
+def run_worker(ctrl, index, workers, inherited):
+    # Drop the front's ends of the control sockets so EOF reaches this worker
+    for sock in inherited:
+        sock.close()
+    asyncio.run(worker_main(ctrl, index, workers))
+
+async def route_client(conn, controls, directory):
+    loop = asyncio.get_running_loop()
+    buffered = bytearray()
+    try:
+        while True:
+            data = await loop.sock_recv(conn, 4096)
+            if not data:
+                conn.close()
+                return
+            buffered += data
+            if len(buffered) > CONTROL_BUFSIZE:
+                raise ValueError("Too much data before join")
+            while len(buffered) >= HEADER.size:
+                length, = HEADER.unpack_from(buffered)
+                if length > MAX_FRAME:
+                    raise ValueError(f"Frame of {length} bytes exceeds MAX_FRAME")
+                if len(buffered) < HEADER.size + length:
+                    break
+                msg = decode_payload(bytes(buffered[HEADER.size:HEADER.size + length]))
+                if msg['type'] == 'rooms':
+                    rooms = [{'name': name, 'players': players} for name, players in directory.merged.items()]
+                    await loop.sock_sendall(conn, encode({'type': 'rooms', 'rooms': rooms}))
+                    del buffered[:HEADER.size + length]
+                elif msg['type'] == 'join':
+                    # The join frame and anything after it go to the worker with the socket
+                    ctrl = controls[room_worker(msg.get('room') or DEFAULT_ROOM, len(controls))]
+                    await send_control(ctrl, bytes(buffered), [conn.fileno()])
+                    conn.close()
+                    return
+                else:
+                    raise ValueError(f"Expected join, got {msg['type']}")
     except Exception as e:
-        print(f"Error handling client {addr}: {e}")
-    finally:
-        with lock:
-            clients[:] = [c for c in clients if c['conn'] != conn]
-            if username in ready_status:
-                del ready_status[username]
+        print(f"Error routing client: {e}")
         conn.close()
-        update_lobby()
 
-def update_lobby():
-    with lock:
-        players = [{'name': c['username'], 'ready': ready_status.get(c['username'], False)} for c in clients]
-        message = {'type': 'lobby', 'players': players}
-        for client in clients:
-            try:
-                client['conn'].send(json.dumps(message).encode())
-            except:
-                pass
-
-def start_server():
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind((HOST, PORT))
-    server.listen()
-    print(f"Server listening on {HOST}:{PORT}")
+class RoomDirectory:
+    # The front's view of every worker's public rooms. A room name can be
+    # listed by more than one worker (each keeps an empty default room), so
+    # the merged count of a changed name is summed over the workers.
+    def __init__(self, workers):
+        self.workers = [{} for _ in range(workers)]
+        self.merged = {}
+
+    def update(self, index, rooms):
+        changed = {}
+        for name, players in rooms.items():
+            if players is None:
+                self.workers[index].pop(name, None)
+            else:
+                self.workers[index][name] = players
+            counts = [worker[name] for worker in self.workers if name in worker]
+            if counts:
+                self.merged[name] = changed[name] = sum(counts)
+            else:
+                self.merged.pop(name, None)
+                changed[name] = None
+        return changed
+
+def on_worker_message(ctrl, index, controls, directory):
+    data, fds = recv_control(ctrl)
+    if not data:
+        if data is None:
+            asyncio.get_running_loop().remove_reader(ctrl.fileno())
+        return
+    msg = json.loads(data)
+    if msg['type'] == 'rooms_changed':
+        changed = directory.update(index, msg['rooms'])
+        for update in room_updates(changed):
+            for other in controls:
+                post_control(other, update)
+    elif msg['type'] == 'score':
+        if leaderboard.submit(msg['name'], msg['score']):
+            leaderboard_cache.clear()
+    elif msg['type'] == 'leaderboard_query':
+        # Cached as the JSON of the reply message, which the worker re-encodes for its client
+        query = msg['query']
+        key = leaderboard_key(query)
+        payload = leaderboard_cache.get(key)
+        if payload is None:
+            payload = json.dumps(leaderboard_message(query))
+            if key is not None:
+                leaderboard_cache[key] = payload
+        post_control(ctrl, f'{{"type": "leaderboard_reply", "request": {msg["request"]}, "message": {payload}}}'.encode())
+
+async def serve_front(controls):
+    loop = asyncio.get_running_loop()
+    directory = RoomDirectory(len(controls))
+    for index, ctrl in enumerate(controls):
+        ctrl.setblocking(False)
+        loop.add_reader(ctrl.fileno(), on_worker_message, ctrl, index, controls, directory)
+    listener = socket.create_server((HOST, PORT), backlog=BACKLOG)
+    listener.setblocking(False)
+    print(f"Server listening on {HOST}:{PORT} with {len(controls)} workers")
     while True:
-        conn, addr = server.accept()
-        threading.Thread(target=handle_client, args=(conn, addr), daemon=True).start()
+        conn, addr = await loop.sock_accept(listener)
+        asyncio.create_task(route_client(conn, controls, directory))
+
+def start_server(workers=WORKERS):
+    if workers <= 1 or not hasattr(socket, 'send_fds'):
+        asyncio.run(serve())
+        return
+    controls = []
+    for index in range(workers):
+        front_end, worker_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        multiprocessing.Process(target=run_worker, args=(worker_end, index, workers, controls + [front_end]),
+                                daemon=True).start()
+        worker_end.close()
+        controls.append(front_end)
+    asyncio.run(serve_front(controls))
 
 if __name__ == "__main__":
-    start_server()
\ No newline at end of file
+    start_server(int(sys.argv[1]) if len(sys.argv) > 1 else WORKERS)